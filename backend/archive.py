@@ -0,0 +1,143 @@
+"""
+Order archival: keeps `orders` / `order_items` down to the retention window.
+
+Orders created before midnight UTC `retention_days` ago are first folded
+into daily rollups (OrderDailyRollup for counts/revenue, SalesHistory for
+per-product units/revenue), then moved to orders_archive /
+order_items_archive with their ids unchanged. Each batch is one transaction,
+so an order is always counted exactly once: either live or in the rollups.
+
+Readers that need all-time numbers (admin stats, sales history for
+forecasting) add the rollups to what they find in the live tables.
+
+Run from the admin API (POST /admin/archive) or:  python archive.py [--retention-days 365]
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import DateTime, func, literal, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+import models
+import forecast_models
+
+ARCHIVE_RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", "365"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "5000"))
+
+ORDER_COLUMNS = ["id", "customer_name", "customer_email", "shipping_address", "total_amount", "status", "created_at"]
+ITEM_COLUMNS = ["id", "order_id", "product_id", "quantity", "price_at_purchase"]
+
+
+def archive_cutoff(retention_days: int, now: datetime = None) -> datetime:
+    """Orders created before this moment are archived (always a midnight, so days are never split)"""
+    now = now or datetime.utcnow()
+    return now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=retention_days)
+
+
+def _archive_batch(db: Session, order_ids: list, archived_at: datetime) -> int:
+    orders = models.Order.__table__
+    items = models.OrderItem.__table__
+    day = func.strftime("%Y-%m-%d 00:00:00.000000", orders.c.created_at)
+
+    # 1. Fold into the rollups (adding to days already partly archived)
+    sales = forecast_models.SalesHistory.__table__
+    stmt = sqlite_insert(sales).from_select(
+        ["product_id", "date", "quantity_sold", "revenue"],
+        select(items.c.product_id, day, func.sum(items.c.quantity),
+               func.sum(items.c.quantity * items.c.price_at_purchase))
+        .select_from(items.join(orders, items.c.order_id == orders.c.id))
+        .where(orders.c.id.in_(order_ids))
+        .group_by(items.c.product_id, day)
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[sales.c.product_id, sales.c.date],
+        set_={"quantity_sold": sales.c.quantity_sold + stmt.excluded.quantity_sold,
+              "revenue": sales.c.revenue + stmt.excluded.revenue}
+    ))
+
+    rollups = models.OrderDailyRollup.__table__
+    stmt = sqlite_insert(rollups).from_select(
+        ["date", "order_count", "total_amount"],
+        select(day, func.count(orders.c.id), func.coalesce(func.sum(orders.c.total_amount), 0.0))
+        .where(orders.c.id.in_(order_ids))
+        .group_by(day)
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[rollups.c.date],
+        set_={"order_count": rollups.c.order_count + stmt.excluded.order_count,
+              "total_amount": rollups.c.total_amount + stmt.excluded.total_amount}
+    ))
+
+    # 2. Move the rows
+    db.execute(models.ArchivedOrder.__table__.insert().from_select(
+        ORDER_COLUMNS + ["archived_at"],
+        select(*[orders.c[c] for c in ORDER_COLUMNS], literal(archived_at, DateTime))
+        .where(orders.c.id.in_(order_ids))
+    ))
+    db.execute(models.ArchivedOrderItem.__table__.insert().from_select(
+        ITEM_COLUMNS,
+        select(*[items.c[c] for c in ITEM_COLUMNS]).where(items.c.order_id.in_(order_ids))
+    ))
+    moved_items = db.execute(items.delete().where(items.c.order_id.in_(order_ids))).rowcount
+    db.execute(orders.delete().where(orders.c.id.in_(order_ids)))
+    return moved_items
+
+
+def archive_orders(db: Session, retention_days: int = ARCHIVE_RETENTION_DAYS,
+                   batch_size: int = ARCHIVE_BATCH_SIZE) -> dict:
+    """Archive every order older than the retention window, oldest first"""
+    if retention_days < 1:
+        raise ValueError("retention_days must be at least 1")
+    cutoff = archive_cutoff(retention_days)
+    archived_at = datetime.utcnow()
+    orders = models.Order.__table__
+
+    archived_orders = archived_items = 0
+    while True:
+        order_ids = db.execute(
+            select(orders.c.id).where(orders.c.created_at < cutoff)
+            .order_by(orders.c.created_at, orders.c.id).limit(batch_size)
+        ).scalars().all()
+        if not order_ids:
+            break
+        archived_items += _archive_batch(db, order_ids, archived_at)
+        archived_orders += len(order_ids)
+        db.commit()
+
+    return {
+        "cutoff": cutoff.isoformat(),
+        "archived_orders": archived_orders,
+        "archived_items": archived_items,
+    }
+
+
+def rollup_totals(db: Session, since: datetime = None):
+    """(order_count, total_amount) of archived orders, optionally from `since` on"""
+    query = db.query(func.coalesce(func.sum(models.OrderDailyRollup.order_count), 0),
+                     func.coalesce(func.sum(models.OrderDailyRollup.total_amount), 0.0))
+    if since is not None:
+        query = query.filter(models.OrderDailyRollup.date >= since)
+    count, amount = query.one()
+    return count, amount
+
+
+def get_archived_order(db: Session, order_id: int):
+    return db.query(models.ArchivedOrder).filter(models.ArchivedOrder.id == order_id).first()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old orders into the archive tables")
+    parser.add_argument("--retention-days", type=int, default=ARCHIVE_RETENTION_DAYS)
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    from database import SessionLocal
+    db = SessionLocal()
+    try:
+        print(archive_orders(db, retention_days=args.retention_days, batch_size=args.batch_size))
+    finally:
+        db.close()
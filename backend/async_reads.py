@@ -0,0 +1,120 @@
+"""
+Async versions of the catalog, order and forecast read endpoints.
+
+They run on the event loop against the aiosqlite read engine instead of
+occupying a threadpool worker each, so slow chat or training requests
+(which still use the threadpool) cannot starve catalog traffic. The query
+logic is shared with the sync endpoints: each handler runs the same crud
+function through AsyncSession.run_sync. Catalog-backed handlers fetch the
+catalog snapshot first with catalog.snapshot_async, which does any reload
+in a worker thread, and hand it to the crud function, so the 50k-row
+reload never runs on the event loop.
+
+main.py includes this router ahead of its own routes when DB_ASYNC_READS
+is enabled, so these handlers take precedence over the sync ones.
+"""
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+import crud
+import schemas
+import search
+import versioning
+from catalog_cache import catalog
+from database import get_async_read_db
+
+router = APIRouter()
+
+
+@router.get("/products/", response_model=List[schemas.Product])
+async def read_products(request: Request, response: Response, skip: int = 0, limit: int = 100,
+                        cursor: Optional[str] = None, category: Optional[str] = None,
+                        db: AsyncSession = Depends(get_async_read_db)):
+    stamps = await db.run_sync(versioning.current, versioning.PRODUCTS)
+    not_modified = versioning.conditional_get(request, response, stamps)
+    if not_modified:
+        return not_modified
+
+    try:
+        snapshot = await catalog.snapshot_async(db)
+        products, next_cursor = await db.run_sync(
+            crud.get_products_page, cursor=cursor, limit=limit, skip=skip, category=category, snapshot=snapshot
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return products
+
+
+@router.get("/products/search", response_model=schemas.ProductSearchResult)
+async def search_products(q: Optional[str] = None, category: Optional[str] = None,
+                          min_price: Optional[float] = None, max_price: Optional[float] = None,
+                          in_stock: Optional[bool] = None, limit: int = 20, offset: int = 0,
+                          db: AsyncSession = Depends(get_async_read_db)):
+    """Ranked full-text product search with category/price/stock facets"""
+    return await db.run_sync(
+        search.search_products, q=q, category=category, min_price=min_price, max_price=max_price,
+        in_stock=in_stock, limit=limit, offset=offset
+    )
+
+
+@router.get("/products/{product_id}", response_model=schemas.Product)
+async def read_product(product_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    snapshot = await catalog.snapshot_async(db)
+    db_product = await db.run_sync(crud.get_product, product_id=product_id, snapshot=snapshot)
+    if not db_product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return db_product
+
+
+@router.get("/orders/", response_model=List[schemas.Order])
+async def read_orders(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                      status: Optional[str] = None, customer_email: Optional[str] = None,
+                      created_from: Optional[datetime] = None, created_to: Optional[datetime] = None,
+                      db: AsyncSession = Depends(get_async_read_db)):
+    try:
+        orders, next_cursor = await db.run_sync(
+            crud.get_orders_page, cursor=cursor, limit=limit, skip=skip, status=status,
+            customer_email=customer_email, created_from=created_from, created_to=created_to
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return orders
+
+
+@router.get("/forecasting/predictions")
+async def get_all_predictions(request: Request, response: Response,
+                              db: AsyncSession = Depends(get_async_read_db)):
+    """Get predictions for all products, returning empty predictions for those without history"""
+    stamps = await db.run_sync(versioning.current, versioning.PRODUCTS, versioning.FORECASTS)
+    not_modified = versioning.conditional_get(request, response, stamps)
+    if not_modified:
+        return not_modified
+
+    snapshot = await catalog.snapshot_async(db)
+    return await db.run_sync(crud.get_all_predictions, snapshot=snapshot)
+
+
+@router.get("/forecasting/predictions/{product_id}")
+async def get_product_predictions(product_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    """Get predictions for a specific product"""
+    snapshot = await catalog.snapshot_async(db)
+    result = await db.run_sync(crud.get_product_predictions, product_id, snapshot=snapshot)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return result
+
+
+@router.get("/forecasting/alerts")
+async def get_stock_alerts(request: Request, response: Response, db: AsyncSession = Depends(get_async_read_db)):
+    """Get all active stock alerts"""
+    stamps = await db.run_sync(versioning.current, versioning.PRODUCTS, versioning.ALERTS)
+    not_modified = versioning.conditional_get(request, response, stamps)
+    if not_modified:
+        return not_modified
+
+    return await db.run_sync(crud.get_active_alerts)
@@ -0,0 +1,147 @@
+"""
+Sync vs async read endpoints under load.
+
+Seeds a scratch database, then starts uvicorn twice (DB_ASYNC_READS=0 and 1)
+and drives the same traffic at each:
+  * readers: GET /products/{id}, /orders/?limit=20, /forecasting/predictions/{id}
+  * hogs:    slow sync requests (GET /forecasting/trends/{id}?days=365) that
+             tie up threadpool workers, like chat or training requests do
+
+Reports requests/sec and p50/p95/p99 latency for the read traffic.
+
+Usage: python benchmark_async.py [--seconds 15] [--readers 64] [--hogs 48]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BACKEND_DIR)
+
+from benchmark_db import seed
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/")
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("uvicorn did not start")
+
+
+def drive(port: int, seconds: float, readers: int, hogs: int, products: int) -> dict:
+    stop = time.monotonic() + seconds
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def client(paths_fn, record: bool):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        local = []
+        while time.monotonic() < stop:
+            path = paths_fn()
+            started = time.perf_counter()
+            try:
+                conn.request("GET", path)
+                response = conn.getresponse()
+                response.read()
+                ok = response.status < 500
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+                ok = False
+            if record:
+                if ok:
+                    local.append(time.perf_counter() - started)
+                else:
+                    with lock:
+                        errors[0] += 1
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    def read_path():
+        product_id = random.randint(1, products)
+        return random.choice([
+            f"/products/{product_id}",
+            "/orders/?limit=20",
+            f"/forecasting/predictions/{product_id}",
+        ])
+
+    def hog_path():
+        return f"/forecasting/trends/{random.randint(1, products)}?days=365"
+
+    threads = [threading.Thread(target=client, args=(read_path, True)) for _ in range(readers)]
+    threads += [threading.Thread(target=client, args=(hog_path, False)) for _ in range(hogs)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    ordered = sorted(latencies)
+    if not ordered:
+        return {"requests": 0, "errors": errors[0]}
+    return {
+        "requests": len(ordered),
+        "requests_per_sec": round(len(ordered) / seconds, 1),
+        "p50_ms": round(statistics.median(ordered) * 1000, 2),
+        "p95_ms": round(ordered[int(len(ordered) * 0.95) - 1] * 1000, 2),
+        "p99_ms": round(ordered[int(len(ordered) * 0.99) - 1] * 1000, 2),
+        "errors": errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--readers", type=int, default=64)
+    parser.add_argument("--hogs", type=int, default=48)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=50_000)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'async_bench.db')}"
+        print(f">> Seeding ({args.products} products, {args.orders} orders)...")
+        seed(url, args.products, args.orders)
+
+        for name, flag in [("sync", "0"), ("async", "1")]:
+            port = free_port()
+            env = dict(os.environ, DATABASE_URL=url, DB_ASYNC_READS=flag)
+            server = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                cwd=BACKEND_DIR, env=env
+            )
+            try:
+                wait_until_up(port)
+                print(f">> {name}: {args.readers} readers + {args.hogs} slow clients for {args.seconds}s...")
+                results[name] = drive(port, args.seconds, args.readers, args.hogs, args.products)
+            finally:
+                server.terminate()
+                server.wait()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
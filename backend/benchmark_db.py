@@ -0,0 +1,179 @@
+"""
+Mixed read/write load benchmark for the SQLite connection setup.
+
+Runs the same workload against two configurations on a scratch database:
+  * baseline: one shared engine, default pool, only journal_mode=WAL
+  * split:    dedicated writer + read-only pool with tuned pragmas (database.py)
+
+Readers run dashboard-style queries (counts, sums, recent orders page);
+writers run checkout transactions and forecast rewrites (delete + 30 inserts).
+
+Usage: python benchmark_db.py [--seconds 10] [--readers 8] [--writers 2]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
+import database
+import models
+import forecast_models
+
+
+def seed(url: str, products: int, orders: int):
+    engine, _ = database.build_engines(url, split=False, pragmas={"synchronous": "OFF"})
+    models.Base.metadata.create_all(bind=engine)
+    forecast_models.Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    start = datetime.utcnow() - timedelta(days=365)
+    with engine.begin() as conn:
+        conn.execute(models.Product.__table__.insert(), [
+            {"id": i, "name": f"Product {i}", "description": "Benchmark product",
+             "price": round(rng.uniform(5, 500), 2), "stock_quantity": 10_000, "category": f"Cat {i % 12}"}
+            for i in range(1, products + 1)
+        ])
+        conn.execute(models.Order.__table__.insert(), [
+            {"id": i, "customer_name": "Bench", "customer_email": f"c{i % 500}@example.com",
+             "shipping_address": "Somewhere", "total_amount": rng.uniform(10, 900), "status": "delivered",
+             "created_at": start + timedelta(minutes=i * 525_600 // orders)}
+            for i in range(1, orders + 1)
+        ])
+        conn.execute(models.OrderItem.__table__.insert(), [
+            {"order_id": i, "product_id": rng.randint(1, products), "quantity": rng.randint(1, 3),
+             "price_at_purchase": 10.0}
+            for i in range(1, orders + 1)
+        ])
+    database.ensure_indexes(models.Base.metadata, bind=engine)
+    engine.dispose()
+
+
+def read_op(db, products: int):
+    db.query(func.count(models.Order.id)).scalar()
+    db.query(func.sum(models.Order.total_amount)).scalar()
+    db.query(models.Order).order_by(models.Order.created_at.desc(), models.Order.id.desc()).limit(10).all()
+    db.query(forecast_models.DemandForecast).filter(
+        forecast_models.DemandForecast.product_id == random.randint(1, products)
+    ).all()
+
+
+def checkout_op(db, products: int):
+    product = db.query(models.Product).filter(models.Product.id == random.randint(1, products)).first()
+    product.stock_quantity -= 1
+    order = models.Order(customer_name="Load", customer_email="load@example.com", shipping_address="x",
+                         total_amount=product.price, status="pending")
+    db.add(order)
+    db.flush()
+    db.add(models.OrderItem(order_id=order.id, product_id=product.id, quantity=1,
+                            price_at_purchase=product.price))
+    db.commit()
+
+
+def forecast_write_op(db, products: int):
+    product_id = random.randint(1, products)
+    db.query(forecast_models.DemandForecast).filter(
+        forecast_models.DemandForecast.product_id == product_id
+    ).delete()
+    today = datetime.utcnow()
+    for day in range(30):
+        db.add(forecast_models.DemandForecast(
+            product_id=product_id, forecast_date=today + timedelta(days=day), predicted_demand=1.0,
+            confidence_lower=0.5, confidence_upper=1.5, model_used="linear_regression"
+        ))
+    db.commit()
+
+
+def run_workload(write_session, read_session, seconds: float, readers: int, writers: int, products: int) -> dict:
+    stop = time.monotonic() + seconds
+    read_latencies, write_latencies = [], []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(session_factory, ops, latencies):
+        local = []
+        while time.monotonic() < stop:
+            op = random.choice(ops)
+            db = session_factory()
+            started = time.perf_counter()
+            try:
+                op(db, products)
+            except Exception as e:
+                db.rollback()
+                with lock:
+                    errors.append(str(e))
+            finally:
+                db.close()
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(read_session, [read_op], read_latencies))
+               for _ in range(readers)]
+    threads += [threading.Thread(target=worker, args=(write_session, [checkout_op, forecast_write_op], write_latencies))
+                for _ in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    def summary(latencies):
+        if not latencies:
+            return {"ops": 0, "ops_per_sec": 0}
+        ordered = sorted(latencies)
+        return {
+            "ops": len(ordered),
+            "ops_per_sec": round(len(ordered) / seconds, 1),
+            "p50_ms": round(statistics.median(ordered) * 1000, 2),
+            "p95_ms": round(ordered[int(len(ordered) * 0.95) - 1] * 1000, 2),
+            "p99_ms": round(ordered[int(len(ordered) * 0.99) - 1] * 1000, 2),
+        }
+
+    return {"reads": summary(read_latencies), "writes": summary(write_latencies),
+            "errors": len(errors), "sample_error": errors[0] if errors else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--products", type=int, default=2_000)
+    parser.add_argument("--orders", type=int, default=200_000)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, split, pragmas in [
+            ("baseline", False, {}),
+            ("split", True, database.SQLITE_PRAGMAS),
+        ]:
+            url = f"sqlite:///{os.path.join(tmp, name + '.db')}"
+            print(f">> Seeding {name} database ({args.products} products, {args.orders} orders)...")
+            seed(url, args.products, args.orders)
+
+            write_engine, read_engine = database.build_engines(
+                url, split=split, pragmas=pragmas, read_pool_size=args.readers
+            )
+            write_session = sessionmaker(autoflush=False, bind=write_engine)
+            read_session = sessionmaker(autoflush=False, bind=read_engine)
+
+            print(f">> Running {name} for {args.seconds}s ({args.readers} readers, {args.writers} writers)...")
+            results[name] = run_workload(write_session, read_session, args.seconds,
+                                         args.readers, args.writers, args.products)
+            write_engine.dispose()
+            read_engine.dispose()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
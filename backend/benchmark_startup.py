@@ -0,0 +1,89 @@
+"""
+API cold-start benchmark.
+
+Each measurement runs in a fresh interpreter, like a new uvicorn worker:
+  * import_s:        time to `import main`
+  * startup_s:       time to run the startup hook (schema init)
+  * first_request_s: latency of the first GET /products/
+  * heavy_modules:   which heavy stacks were loaded before any traffic
+  * first_trends_s:  first /forecasting/trends call, which pays the deferred
+                     pandas/scikit-learn import
+
+Against --database-url the data is left as it was: trends are fetched for an existing
+product, and the probe product an empty database needs is deleted again.
+
+Usage: python benchmark_startup.py [--runs 5] [--database-url sqlite:///...]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient
+heavy = [m for m in ("pandas", "sklearn", "google.generativeai") if m in sys.modules]
+with TestClient(main.app) as client:
+    t2 = time.perf_counter()
+    products = client.get("/products/").json()
+    t3 = time.perf_counter()
+    # Trends for an existing product; an empty catalog gets a throwaway one
+    probe = None if products else client.post(
+        "/products/", json={"name": "Probe", "price": 1, "stock_quantity": 1, "category": "Probe"}).json()
+    product_id = products[0]["id"] if products else probe["id"]
+    t4 = time.perf_counter()
+    client.get(f"/forecasting/trends/{product_id}")
+    t5 = time.perf_counter()
+    if probe is not None:
+        client.delete(f"/products/{probe['id']}")
+print(json.dumps({
+    "import_s": t1 - t0,
+    "startup_s": t2 - t1,
+    "first_request_s": t3 - t2,
+    "first_trends_s": t5 - t4,
+    "heavy_modules": heavy,
+}))
+"""
+
+
+def run_probe(env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--database-url", default=None,
+                        help="Database to start against (default: a scratch SQLite file)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+
+        runs = [run_probe(env) for _ in range(args.runs)]
+
+    summary = {}
+    for key in ("import_s", "startup_s", "first_request_s", "first_trends_s"):
+        values = [r[key] for r in runs]
+        summary[key] = {"median": round(statistics.median(values), 4), "max": round(max(values), 4)}
+    summary["heavy_modules_before_traffic"] = runs[-1]["heavy_modules"]
+    summary["runs"] = args.runs
+
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+In-process read-through cache for the product catalog
+"""
+import asyncio
+import bisect
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+import models
+from database import ReadSessionLocal
+
+
+@dataclass(frozen=True)
+class CachedProduct:
+    """Detached, immutable copy of a Product row"""
+    id: int
+    name: str
+    description: Optional[str]
+    price: float
+    stock_quantity: int
+    category: str
+    image_url: Optional[str]
+    sku: Optional[str]
+
+    @classmethod
+    def from_model(cls, product: models.Product) -> "CachedProduct":
+        return cls(
+            id=product.id,
+            name=product.name,
+            description=product.description,
+            price=product.price,
+            stock_quantity=product.stock_quantity,
+            category=product.category,
+            image_url=product.image_url,
+            sku=product.sku,
+        )
+
+
+class CatalogSnapshot:
+    """
+    Immutable view of the whole catalog at one version.
+    A reader that holds a snapshot sees a consistent catalog for as long as it
+    keeps it, no matter how many writes happen meanwhile.
+    """
+
+    def __init__(self, version: int, products: dict):
+        self.version = version  # id of the newest product change it includes
+        self.loaded_at = time.monotonic()
+        self.by_id = MappingProxyType(products)
+        self.ids = tuple(sorted(products))
+        self.products = tuple(products[i] for i in self.ids)
+
+        by_category = {}
+        for product in self.products:
+            by_category.setdefault(product.category, []).append(product)
+        self.by_category = MappingProxyType({c: tuple(p) for c, p in by_category.items()})
+
+    def __len__(self):
+        return len(self.products)
+
+    def get(self, product_id: int) -> Optional[CachedProduct]:
+        return self.by_id.get(product_id)
+
+    def page(self, after_id: int = None, limit: int = 100, skip: int = 0, category: str = None):
+        """Products in id order, starting after `after_id` (keyset) or at `skip`"""
+        if category is not None:
+            products = self.by_category.get(category, ())
+            ids = [p.id for p in products] if after_id is not None else None
+        else:
+            products, ids = self.products, self.ids
+
+        if after_id is not None:
+            start = bisect.bisect_right(ids, after_id)
+        else:
+            start = skip
+        return products[start:start + limit]
+
+
+class CatalogCache:
+    """
+    Read-through catalog cache that follows the product change log.
+
+    Writers record the products they change in product_changes (see
+    versioning.log_product_changes) in the same transaction. Every read
+    compares the newest change id with the snapshot's (one MAX query on the
+    primary key), so writes by any worker are seen on the next read, and a
+    stale snapshot is brought up to date by reloading only the products
+    changed since. One caller reloads at a time; the others wait for its
+    result instead of loading the catalog themselves. `ttl` forces a full
+    reload now and then, for writes that bypass the log.
+    """
+
+    def __init__(self, ttl: float = 300.0, partial_reload_max: int = 1000):
+        self.ttl = ttl
+        self.partial_reload_max = partial_reload_max
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._reload = None  # Future of the reload in progress, if any
+
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.partial_reloads = 0
+        self.waits = 0
+
+    @property
+    def version(self) -> int:
+        snapshot = self._snapshot
+        return snapshot.version if snapshot is not None else 0
+
+    def _is_fresh(self, snapshot, head: int) -> bool:
+        return (
+            snapshot is not None
+            and snapshot.version == head
+            and time.monotonic() - snapshot.loaded_at < self.ttl
+        )
+
+    @staticmethod
+    def head(db: Session) -> int:
+        """Id of the newest product change, the version a fresh snapshot has"""
+        return db.query(func.max(models.ProductChange.id)).scalar() or 0
+
+    def snapshot(self, db: Session) -> CatalogSnapshot:
+        """Current snapshot, reloading from the database if it is stale"""
+        head = self.head(db)
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot, head):
+            self.hits += 1
+            return snapshot
+        return self._refresh(db, head)
+
+    async def snapshot_async(self, db) -> CatalogSnapshot:
+        """
+        snapshot() for async endpoints: the version check runs on `db` (an
+        AsyncSession), a reload runs in a worker thread with its own session,
+        so a cold or full reload never blocks the event loop.
+        """
+        head = await db.run_sync(self.head)
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot, head):
+            self.hits += 1
+            return snapshot
+        return await run_in_threadpool(self._snapshot_in_thread)
+
+    def _snapshot_in_thread(self) -> CatalogSnapshot:
+        db = ReadSessionLocal()
+        try:
+            return self.snapshot(db)
+        finally:
+            db.close()
+
+    def _refresh(self, db: Session, head: int) -> CatalogSnapshot:
+        while True:
+            with self._lock:
+                snapshot = self._snapshot
+                if self._is_fresh(snapshot, head):
+                    self.hits += 1
+                    return snapshot
+                self.misses += 1
+                future = self._reload
+                owner = future is None
+                if owner:
+                    future = self._reload = Future()
+
+            if owner:
+                break
+            if _on_event_loop():
+                # Blocking here would stall the loop the reload may be running on
+                if snapshot is not None:
+                    return snapshot
+                return self._load(db, None, head)
+            self.waits += 1
+            loaded = future.result()
+            if loaded.version >= head:
+                return loaded
+
+        try:
+            loaded = self._load(db, snapshot, head)
+        except BaseException as exc:
+            with self._lock:
+                self._reload = None
+            future.set_exception(exc)
+            raise
+        with self._lock:
+            current = self._snapshot
+            if current is None or current is snapshot or loaded.version >= current.version:
+                self._snapshot = loaded
+            self._reload = None
+        future.set_result(loaded)
+        return loaded
+
+    def _load(self, db: Session, snapshot: Optional[CatalogSnapshot], head: int) -> CatalogSnapshot:
+        """Snapshot at `head`: `snapshot` patched with the products changed since, or a full load"""
+        changed = None
+        if snapshot is not None and snapshot.version < head \
+                and time.monotonic() - snapshot.loaded_at < self.ttl:
+            changes = db.query(models.ProductChange.id, models.ProductChange.product_id) \
+                .filter(models.ProductChange.id > snapshot.version, models.ProductChange.id <= head) \
+                .order_by(models.ProductChange.id).all()
+            # A gap means the log was pruned past our version
+            if changes and changes[0].id == snapshot.version + 1 \
+                    and all(c.product_id is not None for c in changes):
+                changed = {c.product_id for c in changes}
+                if len(changed) > self.partial_reload_max:
+                    changed = None
+
+        if changed is None:
+            rows = db.query(models.Product).all()
+            products = {p.id: CachedProduct.from_model(p) for p in rows}
+        else:
+            products = dict(snapshot.by_id)
+            rows = db.query(models.Product).filter(models.Product.id.in_(changed)).all()
+            for product_id in changed:
+                products.pop(product_id, None)
+            for p in rows:
+                products[p.id] = CachedProduct.from_model(p)
+
+        with self._lock:
+            self.reloads += 1
+            if changed is not None:
+                self.partial_reloads += 1
+        return CatalogSnapshot(head, products)
+
+    def get(self, db: Session, product_id: int) -> Optional[CachedProduct]:
+        return self.snapshot(db).get(product_id)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        snapshot = self._snapshot
+        return {
+            "version": self.version,
+            "products": len(snapshot) if snapshot is not None else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "partial_reloads": self.partial_reloads,
+            "waits": self.waits,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+catalog = CatalogCache()
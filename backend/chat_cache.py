@@ -0,0 +1,83 @@
+"""
+Bounded LRU/TTL cache of chatbot replies
+
+Shoppers ask the same few questions all day ("price range?", "headphones in
+stock?"), so Gemini replies are kept keyed on the normalized message and the
+catalog version they were generated from. Any product change gives every
+key a new catalog part, so replies never quote stale prices or stock; the
+catalog cache's periodic reload does not. Callers must not cache anything
+order-specific or conversation-specific.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize_query(message: str) -> str:
+    """Case, punctuation and spacing do not change the question"""
+    return " ".join(_WORD.findall(message.lower()))
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1000, ttl: float = 600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (stored_at, reply)
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.bypassed = 0
+
+    def get(self, key: Hashable) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.monotonic() - entry[0] >= self.ttl:
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, reply: str):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), reply)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def bypass(self):
+        """Count a message that was not eligible for caching"""
+        with self._lock:
+            self.bypassed += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "bypassed": self.bypassed,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,152 @@
+"""
+In-process BM25 retrieval over the product catalog for the chatbot
+
+The chatbot only sends Gemini the few products relevant to a message plus a
+precomputed catalog overview (counts, categories, price range), so the
+prompt stays the same size however many products the store has.
+
+The index follows the catalog cache: when a new snapshot is published only
+products whose cached row changed are re-tokenized, and term statistics are
+adjusted incrementally. Unlike the FTS5 search (search.py), which ANDs every
+word, a chat message is scored as a bag of words, so "koi sasta wireless
+headphone hai?" still finds headphones.
+"""
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from typing import List
+
+# Field weights: a term in the name counts three times, the category twice
+NAME_WEIGHT = 3
+CATEGORY_WEIGHT = 2
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# English and Roman Urdu filler words that carry no product meaning
+STOPWORDS = frozenset("""
+a an and any are as at be by can do does for from have how i in is it me my of on or please show
+tell that the there this to what which with you your want need looking buy price prices cost
+kya hai hain ka ki ke ko me mein se aur koi kuch bhi mujhe chahiye hamare apke ap aap wala wali
+kitna kitne kitni kis kon konsa tak ya bata batao dikhao
+""".split())
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in _TOKEN.findall((text or "").lower()):
+        if token in STOPWORDS:
+            continue
+        # Cheap plural folding: "headphones" and "headphone" are one term
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _document(product) -> Counter:
+    terms = Counter(tokenize(product.description))
+    for token in tokenize(product.name):
+        terms[token] += NAME_WEIGHT
+    for token in tokenize(product.category):
+        terms[token] += CATEGORY_WEIGHT
+    return terms
+
+
+def catalog_overview(products) -> str:
+    """Aggregate facts about the whole catalog, computed once per snapshot"""
+    if not products:
+        return "No products available at the moment.\n"
+    prices = [p.price for p in products]
+    in_stock = sum(1 for p in products if p.stock_quantity > 0)
+    categories = Counter(p.category for p in products)
+    by_category = {}
+    for p in products:
+        low, high = by_category.get(p.category, (p.price, p.price))
+        by_category[p.category] = (min(low, p.price), max(high, p.price))
+
+    lines = [
+        "**Catalog Overview:**\n",
+        f"• {len(products)} products, {in_stock} in stock, {len(products) - in_stock} out of stock\n",
+        f"• Price range: ${min(prices)} - ${max(prices)}\n",
+        "• Categories: " + ", ".join(
+            f"{c} ({n}, ${by_category[c][0]}-${by_category[c][1]})" for c, n in categories.most_common()
+        ) + "\n",
+    ]
+    return "".join(lines)
+
+
+class ProductIndex:
+    """BM25 index over the products of the latest catalog snapshot"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._docs = {}        # product id -> (CachedProduct, Counter of terms, length)
+        self._postings = {}    # term -> {product id: term frequency}
+        self._total_length = 0
+        self.overview = ""
+        self.reindexed = 0
+
+    def _remove(self, product_id: int):
+        _, terms, length = self._docs.pop(product_id)
+        for term in terms:
+            posting = self._postings[term]
+            del posting[product_id]
+            if not posting:
+                del self._postings[term]
+        self._total_length -= length
+
+    def _add(self, product):
+        terms = _document(product)
+        length = sum(terms.values())
+        self._docs[product.id] = (product, terms, length)
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[product.id] = tf
+        self._total_length += length
+        self.reindexed += 1
+
+    def sync(self, snapshot):
+        """Bring the index up to date with `snapshot` (cheap if nothing changed)"""
+        if snapshot is self._snapshot:
+            return
+        with self._lock:
+            if snapshot is self._snapshot:
+                return
+            for product_id in [i for i in self._docs if snapshot.get(i) is None]:
+                self._remove(product_id)
+            for product in snapshot.products:
+                current = self._docs.get(product.id)
+                if current is not None and current[0] == product:
+                    continue
+                if current is not None:
+                    self._remove(product.id)
+                self._add(product)
+            self.overview = catalog_overview(snapshot.products)
+            self._snapshot = snapshot
+
+    def search(self, query: str, k: int = 8) -> list:
+        """Top `k` products for `query`, best first; empty if no term matches"""
+        terms = set(tokenize(query))
+        with self._lock:
+            n_docs = len(self._docs)
+            if not terms or not n_docs:
+                return []
+            avg_length = self._total_length / n_docs
+            scores = {}
+            for term in terms:
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for product_id, tf in posting.items():
+                    length = self._docs[product_id][2]
+                    norm = tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length))
+                    scores[product_id] = scores.get(product_id, 0.0) + idf * norm
+            # Equal scores (same wording) prefer products that are in stock
+            docs = self._docs
+            best = heapq.nlargest(k, scores, key=lambda i: (scores[i], docs[i][0].stock_quantity > 0, -i))
+            return [docs[product_id][0] for product_id in best]
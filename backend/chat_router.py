@@ -0,0 +1,243 @@
+"""
+Deterministic fast path for the chatbot
+
+Order-status lookups ("ORD-0011 ka status?", "where is my order? ali@x.com"
+answers from that customer's own orders), store policy questions
+("delivery policy kya hai?") and contact questions are answered from the
+database and fixed templates, in English or Roman Urdu to match the user.
+Only messages made up entirely of an intent's vocabulary (plus filler words)
+are routed; anything else, e.g. "return policy for headphones?", falls
+through to Gemini, which still has the full context.
+"""
+import re
+import threading
+from typing import Optional
+from sqlalchemy.orm import Session
+import models
+import archive
+import crud
+
+_WORD = re.compile(r"[a-z0-9]+")
+_ORDER_ID = re.compile(r"\bORD[-\s]?(\d+)\b", re.IGNORECASE)
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_PHRASES = [
+    (re.compile(r"cash\s+on\s+delivery"), "cod"),
+    (re.compile(r"e-?mail"), "email"),
+]
+
+# Words that mark a message as Roman Urdu
+URDU_MARKERS = frozenset("""
+kya hai hain hy ka ki ke ko mein se aur kaise kab kahan kitne kitna kitni mujhe mera meri karein
+karna karun batao bataen batayen bataye nahi hoti hota hogi hoga milega milegi ayega aayega sakta sakti
+sakte chahiye apka apki aapka aapki rabta wapas wapsi din lagte lagenge abhi tak
+""".split())
+
+# Words that never change what is being asked
+FILLER = URDU_MARKERS | frozenset("""
+a an the is are was be do does did can could will would i me my you your our we us it its this that
+what whats which how when where please plz pls kindly tell know about info information details detail
+for of on in to with and or any hi hello salam aoa sir madam bhai thanks thank ok policy policies
+store techmart available ap aap hamara hamare apke aapke ye yeh wo woh ho
+""".split())
+
+# Intent vocabulary as (anchor words, words that may accompany them): a
+# message is routed when it has an anchor and every other non-filler word
+# belongs to the matched intents
+INTENT_WORDS = {
+    "delivery": (
+        frozenset("delivery deliver shipping ship shipment dispatch".split()),
+        frozenset("days day long take takes time fast charges lagta lagti".split()),
+    ),
+    "returns": (
+        frozenset("return returns returning refund refunds exchange replacement".split()),
+        frozenset("replace defective damaged kharab broken item".split()),
+    ),
+    "payment": (
+        frozenset("payment payments pay paying cod".split()),
+        frozenset("cash card credit debit method methods options accept".split()),
+    ),
+    "contact": (
+        frozenset("contact phone email whatsapp support owner helpline".split()),
+        frozenset("number call mail reach talk baat customer care service team".split()),
+    ),
+}
+
+ORDER_WORDS = frozenset("""
+order orders status track tracking where update check delivered delivery shipped shipment dispatched
+parcel package current
+""".split())
+
+# Words that make a message about the user's orders when no Order ID is given
+ORDER_ANCHORS = frozenset("order orders track tracking parcel package".split())
+
+# How many of a customer's orders a reply lists
+CUSTOMER_ORDERS_SHOWN = 5
+
+STATUS_TEXT = {
+    "en": {
+        "pending": "order received, awaiting payment",
+        "processing": "payment confirmed, preparing shipment",
+        "shipped": "dispatched and in transit",
+        "delivered": "successfully delivered",
+        "cancelled": "this order was cancelled",
+    },
+    "ur": {
+        "pending": "order mil gaya hai, payment ka intezar hai",
+        "processing": "payment confirm ho gayi hai, shipment tayyar ho rahi hai",
+        "shipped": "order dispatch ho chuka hai, raste mein hai",
+        "delivered": "order deliver ho chuka hai",
+        "cancelled": "ye order cancel ho chuka hai",
+    },
+}
+
+
+def detect_language(words) -> str:
+    return "ur" if any(w in URDU_MARKERS for w in words) else "en"
+
+
+def find_order(db: Session, order_id: int):
+    """Live order, or the archived copy for orders past the retention window"""
+    order = db.query(models.Order).filter(models.Order.id == order_id).first()
+    if order is None:
+        order = archive.get_archived_order(db, order_id)
+    return order
+
+
+def format_order_id(order_id: int) -> str:
+    return f"ORD-{str(order_id).zfill(4)}"
+
+
+def find_email(text: str) -> Optional[str]:
+    """First email address in `text`, lowercased"""
+    match = _EMAIL.search(text)
+    return match.group(0).lower() if match else None
+
+
+class IntentRouter:
+    """Answers the intents above locally and counts how much traffic it served"""
+
+    def __init__(self, store_info: dict):
+        self.store = store_info
+        self._lock = threading.Lock()
+        self.messages = 0
+        self.served = {}  # intent -> messages answered locally
+
+    def _templates(self, lang: str) -> dict:
+        s = self.store
+        if lang == "ur":
+            return {
+                "delivery": "🚚 Delivery 3-5 business days mein hoti hai.",
+                "returns": "🔄 Defective items ke liye 7-day return policy hai. "
+                           f"Return ke liye {s['contact']} par rabta karein.",
+                "payment": "💳 Hum Cash on Delivery (COD) aur Credit Card dono accept karte hain.",
+                "contact": f"📞 Aap humse {s['contact']} par call ya {s['email']} par email kar sakte hain. "
+                           f"Store owner: {s['owner']}.",
+            }
+        return {
+            "delivery": "🚚 Delivery takes 3-5 business days.",
+            "returns": "🔄 We have a 7-day return policy for defective items. "
+                       f"Contact {s['contact']} to start a return.",
+            "payment": "💳 We accept Cash on Delivery (COD) and Credit Card.",
+            "contact": f"📞 You can call us at {s['contact']} or email {s['email']}. "
+                       f"Store owner: {s['owner']}.",
+        }
+
+    @staticmethod
+    def _order_line(order, lang: str) -> str:
+        label = format_order_id(order.id)
+        status = (order.status or "").lower()
+        detail = STATUS_TEXT[lang].get(status, status)
+        items = ", ".join(
+            f"{item.product.name if item.product else 'Unknown Product'} x{item.quantity}"
+            for item in order.items
+        )
+        placed = order.created_at.strftime('%Y-%m-%d')
+        if lang == "ur":
+            return (f"📦 {label} ka status: {status.upper()} ({detail}). "
+                    f"Order date: {placed}, total: ${order.total_amount}. Items: {items or '-'}")
+        return (f"📦 {label} is {status.upper()} ({detail}). "
+                f"Placed on {placed}, total ${order.total_amount}. Items: {items or '-'}")
+
+    def _order_reply(self, db: Session, order_ids: list, lang: str) -> str:
+        lines = []
+        for order_id in order_ids:
+            order = find_order(db, order_id)
+            if order is not None:
+                lines.append(self._order_line(order, lang))
+                continue
+            label = format_order_id(order_id)
+            if lang == "ur":
+                lines.append(f"⚠️ {label}: Order nahi mila. Please verify Order ID ya contact support "
+                             f"({self.store['contact']}).")
+            else:
+                lines.append(f"⚠️ {label}: Order not found. Please verify the Order ID or contact support "
+                             f"({self.store['contact']}).")
+        return "\n".join(lines)
+
+    def _customer_reply(self, db: Session, email: str, lang: str) -> str:
+        orders = crud.get_customer_orders(db, email, limit=CUSTOMER_ORDERS_SHOWN)
+        if not orders:
+            if lang == "ur":
+                return (f"⚠️ {email} par koi order nahi mila. Please checkout wali email ya Order ID "
+                        f"(jaise ORD-0012) check karein.")
+            return (f"⚠️ No orders found for {email}. Please check the email you used at checkout "
+                    f"or share your Order ID (e.g. ORD-0012).")
+        header = f"Aapke orders ({email}):" if lang == "ur" else f"Your orders ({email}):"
+        return "\n".join([header] + [self._order_line(order, lang) for order in orders])
+
+    @staticmethod
+    def _ask_for_order(lang: str) -> str:
+        if lang == "ur":
+            return ("📦 Order check karne ke liye apna Order ID (jaise ORD-0012) ya checkout wali "
+                    "email bata dein.")
+        return "📦 To check your order, please share your Order ID (e.g. ORD-0012) or the email you used at checkout."
+
+    def route(self, db: Session, message: str, known_email: str = None) -> Optional[str]:
+        """
+        Local reply for `message`, or None if it needs the LLM. `known_email`
+        is an address the user gave earlier in the conversation.
+        """
+        text = message.lower()
+        email = find_email(text)
+        text = _EMAIL.sub(" ", text)
+        for pattern, replacement in _PHRASES:
+            text = pattern.sub(replacement, text)
+        order_ids = list(dict.fromkeys(int(n) for n in _ORDER_ID.findall(text)))
+        text = _ORDER_ID.sub(" ", text)
+        words = _WORD.findall(text)
+        lang = detect_language(words)
+        content = [w for w in words if w not in FILLER]
+
+        intent, reply = None, None
+        if order_ids:
+            if all(w in ORDER_WORDS for w in content):
+                intent, reply = "order_status", self._order_reply(db, order_ids[:5], lang)
+        elif any(w in ORDER_ANCHORS for w in content) and all(w in ORDER_WORDS or w == "email" for w in content):
+            if email or known_email:
+                intent, reply = "customer_orders", self._customer_reply(db, email or known_email, lang)
+            else:
+                intent, reply = "order_lookup_prompt", self._ask_for_order(lang)
+        elif content and not email:
+            matched = [name for name, (anchors, _) in INTENT_WORDS.items() if any(w in anchors for w in content)]
+            vocab = set().union(*(INTENT_WORDS[name][0] | INTENT_WORDS[name][1] for name in matched))
+            covered = all(w in vocab for w in content)
+            if matched and covered:
+                templates = self._templates(lang)
+                intent, reply = "+".join(matched), "\n".join(templates[name] for name in matched)
+
+        with self._lock:
+            self.messages += 1
+            if intent is not None:
+                self.served[intent] = self.served.get(intent, 0) + 1
+        return reply
+
+    def stats(self) -> dict:
+        with self._lock:
+            local = sum(self.served.values())
+            return {
+                "messages": self.messages,
+                "served_locally": local,
+                "passed_through": self.messages - local,
+                "local_fraction": round(local / self.messages, 4) if self.messages else 0.0,
+                "by_intent": dict(self.served),
+            }
@@ -0,0 +1,113 @@
+"""
+Per-message chatbot telemetry
+
+Every chat message gets a ChatTrace: how it was answered (locally, from the
+reply cache, by the LLM or with a fallback), prompt size by section, time
+spent preparing the prompt (and the SQL part of that), time in the LLM and
+the number of LLM attempts. The last CHAT_TELEMETRY_WINDOW traces are kept
+and summarized with percentiles by GET /chat/telemetry, so it is visible
+which prompt section drives cost as the catalog grows.
+
+Token counts are estimates (characters / CHARS_PER_TOKEN): asking the
+provider to count them would cost a round trip per message.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+CHAT_TELEMETRY_WINDOW = int(os.getenv("CHAT_TELEMETRY_WINDOW", "2000"))
+CHARS_PER_TOKEN = 4
+
+SECTIONS = ("store", "catalog", "orders", "history", "query")
+OUTCOMES = ("local", "cached", "llm", "fallback")
+
+
+class ChatTrace:
+    __slots__ = ("started", "outcome", "sections", "prepare_seconds", "db_seconds", "llm_seconds",
+                 "attempts", "first_token_seconds")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.outcome = None
+        self.sections = None  # section -> prompt characters, if a prompt was built
+        self.prepare_seconds = 0.0  # routing, cache lookup, context and prompt building
+        self.db_seconds = 0.0  # SQL time within that (when run inside an HTTP request)
+        self.llm_seconds = 0.0
+        self.attempts = 0
+        self.first_token_seconds = None
+
+    def mark_first_token(self):
+        if self.first_token_seconds is None:
+            self.first_token_seconds = time.perf_counter() - self.started
+
+
+def percentiles(values) -> dict:
+    ordered = sorted(values)
+    if not ordered:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0, "mean": 0.0}
+
+    def pick(pct):
+        return ordered[max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))]
+
+    return {
+        "p50": round(pick(50), 2),
+        "p95": round(pick(95), 2),
+        "p99": round(pick(99), 2),
+        "max": round(ordered[-1], 2),
+        "mean": round(sum(ordered) / len(ordered), 2),
+    }
+
+
+class ChatTelemetry:
+    def __init__(self, window: int = CHAT_TELEMETRY_WINDOW):
+        self._lock = threading.Lock()
+        # (outcome, total_ms, db_ms, llm_ms, attempts, first_token_ms, sections, prepare_ms)
+        self._recent = deque(maxlen=window)
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+
+    def record(self, trace: ChatTrace):
+        total_ms = (time.perf_counter() - trace.started) * 1000
+        first_token_ms = trace.first_token_seconds * 1000 if trace.first_token_seconds is not None else None
+        entry = (trace.outcome, total_ms, trace.db_seconds * 1000, trace.llm_seconds * 1000, trace.attempts,
+                 first_token_ms, trace.sections, trace.prepare_seconds * 1000)
+        with self._lock:
+            self._recent.append(entry)
+            self.outcomes[trace.outcome] = self.outcomes.get(trace.outcome, 0) + 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            recent = list(self._recent)
+            outcomes = dict(self.outcomes)
+
+        total = sum(outcomes.values())
+        prompted = [e for e in recent if e[6] is not None]
+        llm_calls = [e for e in recent if e[4]]
+        section_chars = {name: [e[6][name] for e in prompted] for name in SECTIONS}
+        all_chars = sum(sum(values) for values in section_chars.values())
+        return {
+            "messages": total,
+            "window": len(recent),
+            "outcomes": outcomes,
+            "cache_hit_rate": round(outcomes.get("cached", 0) / total, 4) if total else 0.0,
+            "latency_ms": {
+                "total": percentiles(e[1] for e in recent),
+                "prepare": percentiles(e[7] for e in recent),
+                "db": percentiles(e[2] for e in recent),
+                "llm": percentiles(e[3] for e in llm_calls),
+                "first_token": percentiles(e[5] for e in recent if e[5] is not None),
+            },
+            "llm_attempts": {
+                **percentiles(e[4] for e in llm_calls),
+                "retried_messages": sum(1 for e in llm_calls if e[4] > 1),
+            },
+            "prompt_chars": {
+                "total": percentiles(sum(e[6].values()) for e in prompted),
+                **{name: percentiles(values) for name, values in section_chars.items()},
+            },
+            "prompt_tokens_estimate": percentiles(sum(e[6].values()) / CHARS_PER_TOKEN for e in prompted),
+            "prompt_share": {
+                name: round(sum(values) / all_chars, 4) if all_chars else 0.0
+                for name, values in section_chars.items()
+            },
+        }
@@ -1,20 +1,46 @@
-import google.generativeai as genai
+import asyncio
 import os
+import random
 import re
+import threading
 import time
 from dotenv import load_dotenv
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 import models
+import crud
+from catalog_cache import catalog
+from chat_retrieval import ProductIndex
+from chat_router import CUSTOMER_ORDERS_SHOWN, IntentRouter, find_email, find_order, format_order_id
+from chat_cache import ResponseCache, normalize_query
+from circuit_breaker import CircuitBreaker, OPEN
+import llm_providers
+from chat_telemetry import ChatTelemetry, ChatTrace
+import metrics
+from conversations import ConversationContext, ConversationStore, is_follow_up, render_history
 
 # Load environment variables from .env file
 env_path = os.path.join(os.path.dirname(__file__), '.env')
 load_dotenv(env_path)
 
-# Configure Gemini API
-GOOGLE_API_KEY = os.getenv("GEMINI_API_KEY")
-if GOOGLE_API_KEY:
-    genai.configure(api_key=GOOGLE_API_KEY)
+# Answer order-status / policy / contact questions without calling Gemini
+CHAT_FAST_PATH = os.getenv("CHAT_FAST_PATH", "1") == "1"
+
+# Cache of Gemini replies to non-order questions (0 entries disables it)
+CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", "1000"))
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "600"))
+
+# Outbound Gemini calls: retries, timeout, concurrency cap and circuit breaker
+CHAT_LLM_MAX_RETRIES = int(os.getenv("CHAT_LLM_MAX_RETRIES", "3"))
+CHAT_LLM_RETRY_DELAY = float(os.getenv("CHAT_LLM_RETRY_DELAY", "1.0"))
+CHAT_LLM_TIMEOUT = float(os.getenv("CHAT_LLM_TIMEOUT", "30"))
+CHAT_LLM_MAX_CONCURRENCY = int(os.getenv("CHAT_LLM_MAX_CONCURRENCY", "8"))
+CHAT_LLM_QUEUE_TIMEOUT = float(os.getenv("CHAT_LLM_QUEUE_TIMEOUT", "5"))
+CHAT_LLM_BREAKER_FAILURES = int(os.getenv("CHAT_LLM_BREAKER_FAILURES", "5"))
+CHAT_LLM_BREAKER_RESET = float(os.getenv("CHAT_LLM_BREAKER_RESET", "30"))
+
+# Catalogs larger than this are summarized and only the top matches listed
+CHAT_TOP_K = int(os.getenv("CHAT_TOP_K", "8"))
 
 # Store Information
 STORE_INFO = {
@@ -25,74 +51,9 @@ STORE_INFO = {
     "description": "Your trusted online store for smart tech products"
 }
 
-def get_chat_response(db: Session, user_message: str) -> str:
-    """
-    Enhanced chatbot with better error handling, retry logic, and optimized context.
-    """
-    if not GOOGLE_API_KEY:
-        return "I am an AI assistant, but my brain (API Key) is missing. Please tell the admin to configure the GEMINI_API_KEY."
-
-    # Retry logic with exponential backoff
-    max_retries = 3
-    retry_delay = 1  # seconds
-    
-    for attempt in range(max_retries):
-        try:
-            # 1. Build Product Context (Optimized)
-            products = db.query(models.Product).all()
-            
-            if not products:
-                product_context = "No products available at the moment.\n"
-            else:
-                product_context = "**Available Products:**\n"
-                for p in products:
-                    status = "✅ In Stock" if p.stock_quantity > 0 else "❌ Out of Stock"
-                    product_context += f"• {p.name} - ${p.price} | Category: {p.category} | {status}\n"
-                    product_context += f"  Description: {p.description}\n"
-
-            # 2. Build Order Context (Only if needed - Optimized)
-            order_context = ""
-            user_message_upper = user_message.upper()
-            
-            # Check if user is asking about orders
-            order_keywords = ["ORDER", "ORD-", "STATUS", "DELIVERY", "TRACKING", "SHIPMENT"]
-            is_order_query = any(keyword in user_message_upper for keyword in order_keywords)
-            
-            if is_order_query:
-                # Extract specific order ID if mentioned
-                order_match = re.search(r'ORD-(\d+)', user_message_upper)
-                
-                if order_match:
-                    # User asked about specific order
-                    order_num = int(order_match.group(1))
-                    specific_order = db.query(models.Order).filter(models.Order.id == order_num).first()
-                    
-                    if specific_order:
-                        order_id = f"ORD-{str(specific_order.id).zfill(4)}"
-                        order_context = f"\n**📦 Order Details for {order_id}:**\n"
-                        order_context += f"• Status: {specific_order.status.upper()}\n"
-                        order_context += f"• Customer: {specific_order.customer_name}\n"
-                        order_context += f"• Email: {specific_order.customer_email}\n"
-                        order_context += f"• Shipping Address: {specific_order.shipping_address}\n"
-                        order_context += f"• Total Amount: ${specific_order.total_amount}\n"
-                        order_context += f"• Order Date: {specific_order.created_at.strftime('%Y-%m-%d %H:%M')}\n"
-                        order_context += f"• Items Ordered:\n"
-                        for item in specific_order.items:
-                            product_name = item.product.name if item.product else "Unknown Product"
-                            order_context += f"  - {product_name} x{item.quantity} @ ${item.price_at_purchase}\n"
-                    else:
-                        order_context = f"\n⚠️ Order ORD-{str(order_num).zfill(4)} not found in database.\n"
-                else:
-                    # General order query - show recent orders (limit to 10 for efficiency)
-                    recent_orders = db.query(models.Order).order_by(models.Order.created_at.desc()).limit(10).all()
-                    if recent_orders:
-                        order_context = "\n**📦 Recent Orders:**\n"
-                        for o in recent_orders:
-                            order_id = f"ORD-{str(o.id).zfill(4)}"
-                            order_context += f"• {order_id} - {o.status.upper()} | Customer: {o.customer_name} | ${o.total_amount}\n"
-
-            # 3. Construct Optimized System Prompt
-            system_prompt = f"""You are a helpful AI Sales Assistant for {STORE_INFO['name']}, an e-commerce store.
+# The system prompt is assembled from these precompiled pieces around the
+# per-message sections, instead of re-rendering one big f-string each time.
+_PROMPT_HEAD = f"""You are a helpful AI Sales Assistant for {STORE_INFO['name']}, an e-commerce store.
 
 **STORE INFORMATION:**
 • Store Name: {STORE_INFO['name']}
@@ -102,10 +63,14 @@ def get_chat_response(db: Session, user_message: str) -> str:
 • About: {STORE_INFO['description']}
 
 **PRODUCT CATALOG:**
-{product_context}
+"""
+
+_PROMPT_ORDERS = """
 
 **ORDER INFORMATION:**
-{order_context if order_context else "No order information requested."}
+"""
+
+_PROMPT_TAIL = f"""
 
 **STORE POLICIES:**
 • 🚚 Delivery: 3-5 business days
@@ -145,66 +110,551 @@ User: "delivery policy kya hai?"
 You: "Delivery 3-5 business days mein hoti hai. 🚚"
 
 User: "ORD-0011 ka status?"
-You: [Check order info above and provide status]
-
-Now answer this query: {user_message}"""
-
-            # 4. Configure Safety Settings for Better Reliability
-            safety_settings = [
-                {
-                    "category": "HARM_CATEGORY_HARASSMENT",
-                    "threshold": "BLOCK_NONE"
-                },
-                {
-                    "category": "HARM_CATEGORY_HATE_SPEECH",
-                    "threshold": "BLOCK_NONE"
-                },
-                {
-                    "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                    "threshold": "BLOCK_NONE"
-                },
-                {
-                    "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                    "threshold": "BLOCK_NONE"
-                }
-            ]
-
-            # 5. Call Gemini API with configuration
-            generation_config = {
-                "temperature": 0.7,
-                "top_p": 0.95,
-                "top_k": 40,
-                "max_output_tokens": 500,
-            }
-            
-            model = genai.GenerativeModel(
-                model_name='gemini-2.5-flash',
-                generation_config=generation_config,
-                safety_settings=safety_settings
-            )
-            
-            response = model.generate_content(system_prompt)
-            
-            # Check if response was blocked
-            if not response.text:
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # Exponential backoff
-                    continue
-                return "Sorry, main abhi soch nahi pa raha. Please thodi der baad try karein. 🤖"
-            
-            return response.text.strip()
+You: [Check order info above and provide status]"""
+
+_PROMPT_HISTORY = """
+
+**CONVERSATION SO FAR:**
+"""
+
+_PROMPT_QUERY = """
+
+Now answer this query: """
+
+_NO_ORDER_CONTEXT = "No order information requested."
+
+# Safety settings and generation config for every Gemini call
+SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+]
+
+GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 500,
+}
+
+# Gemini, or the local stub with LLM_PROVIDER=stub (see llm_providers.py);
+# the client is created once and shared by every request
+llm = llm_providers.create_provider(generation_config=GENERATION_CONFIG, safety_settings=SAFETY_SETTINGS)
+
+
+def build_system_prompt(product_context: str, order_context: str, user_message: str, history: str = "") -> str:
+    return "".join((
+        _PROMPT_HEAD, product_context,
+        _PROMPT_ORDERS, order_context or _NO_ORDER_CONTEXT,
+        _PROMPT_TAIL,
+        _PROMPT_HISTORY if history else "", history,
+        _PROMPT_QUERY, user_message,
+    ))
+
+
+def _product_lines(p) -> str:
+    status = "✅ In Stock" if p.stock_quantity > 0 else "❌ Out of Stock"
+    return (f"• {p.name} - ${p.price} | Category: {p.category} | {status}\n"
+            f"  Description: {p.description}\n")
+
+
+class ProductContextCache:
+    """
+    Product section of the prompt, kept per catalog snapshot.
+
+    Small catalogs (up to CHAT_TOP_K products) are listed in full. Larger ones
+    are summarized by the precomputed catalog overview plus the CHAT_TOP_K
+    products the BM25 index ranks highest for the message, so the prompt no
+    longer grows with the catalog. Rendered product lines are reused until the
+    product's cached row changes.
+    """
+
+    def __init__(self, top_k: int = CHAT_TOP_K):
+        self.top_k = top_k
+        self.index = ProductIndex()
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._lines = {}  # product id -> (CachedProduct, rendered lines)
+        self._text = ""
+        self.renders = 0
+
+    def _line(self, p) -> str:
+        cached = self._lines.get(p.id)
+        if cached is None or cached[0] != p:
+            cached = (p, _product_lines(p))
+            self._lines[p.id] = cached
+            self.renders += 1
+        return cached[1]
+
+    def _full_listing(self, snapshot) -> str:
+        if snapshot is self._snapshot:
+            return self._text
+        with self._lock:
+            if snapshot is not self._snapshot:
+                if not snapshot.products:
+                    text = "No products available at the moment.\n"
+                else:
+                    text = "**Available Products:**\n" + "".join(self._line(p) for p in snapshot.products)
+                self._text, self._snapshot = text, snapshot
+            return self._text
+
+    def get(self, db: Session, user_message: str = "") -> str:
+        snapshot = catalog.snapshot(db)
+        if len(snapshot) <= self.top_k:
+            return self._full_listing(snapshot)
+
+        self.index.sync(snapshot)
+        matches = self.index.search(user_message, self.top_k)
+        parts = [self.index.overview]
+        if matches:
+            with self._lock:
+                parts.append("\n**Relevant Products:**\n")
+                parts.extend(self._line(p) for p in matches)
+        else:
+            parts.append("\nNo specific product matched this query; ask the user what they are looking for.\n")
+        return "".join(parts)
+
+
+product_context = ProductContextCache()
+router = IntentRouter(STORE_INFO)
+conversations = ConversationStore()
+telemetry = ChatTelemetry()
+response_cache = ResponseCache(max_entries=CHAT_CACHE_SIZE, ttl=CHAT_CACHE_TTL)
+
+ORDER_KEYWORDS = ["ORDER", "ORD-", "STATUS", "DELIVERY", "TRACKING", "SHIPMENT"]
+
+
+def is_order_query(user_message: str) -> bool:
+    user_message_upper = user_message.upper()
+    return any(keyword in user_message_upper for keyword in ORDER_KEYWORDS)
+
+
+def known_email(history: ConversationContext = None):
+    """Most recent email address the user gave in this conversation"""
+    if history is None:
+        return None
+    for user_message, _ in reversed(history.turns):
+        email = find_email(user_message)
+        if email:
+            return email
+    for line in reversed(history.summary):
+        email = find_email(line)
+        if email:
+            return email
+    return None
+
+
+def build_order_context(db: Session, user_message: str, email: str = None) -> str:
+    """
+    Order details for order-related questions, empty otherwise. Without an
+    Order ID only the orders of `email` (or an address in the message) are
+    shown, never other customers'.
+    """
+    # Check if user is asking about orders
+    if not is_order_query(user_message):
+        return ""
+    user_message_upper = user_message.upper()
+
+    # Extract specific order ID if mentioned
+    order_match = re.search(r'ORD-(\d+)', user_message_upper)
+    if order_match:
+        # User asked about specific order
+        order_num = int(order_match.group(1))
+        # Old orders live in the archive tables (same ids, same fields)
+        specific_order = find_order(db, order_num)
+
+        if not specific_order:
+            return f"\n⚠️ Order {format_order_id(order_num)} not found in database.\n"
+
+        order_id = format_order_id(specific_order.id)
+        parts = [
+            f"\n**📦 Order Details for {order_id}:**\n",
+            f"• Status: {specific_order.status.upper()}\n",
+            f"• Customer: {specific_order.customer_name}\n",
+            f"• Email: {specific_order.customer_email}\n",
+            f"• Shipping Address: {specific_order.shipping_address}\n",
+            f"• Total Amount: ${specific_order.total_amount}\n",
+            f"• Order Date: {specific_order.created_at.strftime('%Y-%m-%d %H:%M')}\n",
+            "• Items Ordered:\n",
+        ]
+        for item in specific_order.items:
+            product_name = item.product.name if item.product else "Unknown Product"
+            parts.append(f"  - {product_name} x{item.quantity} @ ${item.price_at_purchase}\n")
+        return "".join(parts)
+
+    # General order query - the customer's own recent orders (one indexed query)
+    email = find_email(user_message) or email
+    if not email:
+        return ("\nThe user gave no Order ID or email. Ask for their Order ID (e.g. ORD-0012) or the "
+                "email they used at checkout; never list other customers' orders.\n")
+    customer_orders = crud.get_customer_orders(db, email, limit=CUSTOMER_ORDERS_SHOWN)
+    if not customer_orders:
+        return f"\n⚠️ No orders found for {email}.\n"
+    parts = [f"\n**📦 Orders for {email}:**\n"]
+    for o in customer_orders:
+        order_id = format_order_id(o.id)
+        parts.append(f"• {order_id} - {o.status.upper()} | {o.created_at.strftime('%Y-%m-%d')} | ${o.total_amount}\n")
+    return "".join(parts)
+
+
+FALLBACK_NO_KEY = "I am an AI assistant, but my brain (API Key) is missing. Please tell the admin to configure the GEMINI_API_KEY."
+FALLBACK_EMPTY = "Sorry, main abhi soch nahi pa raha. Please thodi der baad try karein. 🤖"
+FALLBACK_ERROR = f"Sorry, main abhi kuch technical issue face kar raha hoon. Please {STORE_INFO['contact']} par contact karein. 🤖"
+FALLBACK_BUSY = "Sorry, abhi bohat zyada log chat kar rahe hain. Please thodi der baad try karein. 🤖"
+_FALLBACKS = {FALLBACK_NO_KEY, FALLBACK_EMPTY, FALLBACK_ERROR, FALLBACK_BUSY}
+
+
+def prepare_chat(db: Session, user_message: str, history: ConversationContext = None, trace: ChatTrace = None):
+    """
+    Everything before the Gemini call (all the database work): returns
+    (reply, None, None) when the message is answered locally or from the
+    cache, else (None, system_prompt, cache_key).
+    """
+    started = time.perf_counter()
+    request = metrics.current_request()
+    sql_before = request.sql_time if request is not None else 0.0
+    try:
+        return _prepare_chat(db, user_message, history, trace)
+    finally:
+        if trace is not None:
+            trace.prepare_seconds = time.perf_counter() - started
+            if request is not None:
+                trace.db_seconds = request.sql_time - sql_before
+
+
+def prepare_chat_and_release(db: Session, user_message: str, history: ConversationContext = None,
+                             trace: ChatTrace = None):
+    """
+    prepare_chat(), then close `db` so its pooled connection goes back before
+    the LLM call (queueing, retries, streaming), which needs no database
+    """
+    try:
+        return prepare_chat(db, user_message, history, trace)
+    finally:
+        db.close()
+
+
+def _prepare_chat(db: Session, user_message: str, history: ConversationContext, trace: ChatTrace):
+    if CHAT_FAST_PATH:
+        reply = router.route(db, user_message, known_email(history))
+        if reply is not None:
+            if trace is not None:
+                trace.outcome = "local"
+            return reply, None, None
+
+    if not llm.available:
+        return FALLBACK_NO_KEY, None, None
+
+    # Order answers depend on live order data (and who is asking) and are
+    # never cached. Other self-contained questions are answered without the
+    # conversation, so one cached reply serves every session; only follow-ups
+    # ("and the cheaper one?") get the history, and skip the cache.
+    order_query = is_order_query(user_message)
+    context = history if order_query or (history is not None and is_follow_up(user_message)) else None
+    cache_key = None
+    if CHAT_CACHE_SIZE > 0 and context is None and not order_query:
+        snapshot = catalog.snapshot(db)
+        cache_key = (normalize_query(user_message), snapshot.version)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            if trace is not None:
+                trace.outcome = "cached"
+            return cached, None, None
+    else:
+        response_cache.bypass()
+
+    # Build the prompt once; only the Gemini call is retried. Follow-ups
+    # ("and the cheaper one?") retrieve products for the previous question too.
+    retrieval_query = user_message
+    history_text = ""
+    if context is not None:
+        retrieval_query = f"{context.last_user_message} {user_message}"
+        history_text = render_history(context)
+    catalog_text = product_context.get(db, retrieval_query)
+    order_text = build_order_context(db, user_message, known_email(history))
+    system_prompt = build_system_prompt(catalog_text, order_text, user_message, history_text)
+    if trace is not None:
+        sections = {
+            "catalog": len(catalog_text),
+            "orders": len(order_text or _NO_ORDER_CONTEXT),
+            "history": len(_PROMPT_HISTORY) + len(history_text) if history_text else 0,
+            "query": len(user_message),
+        }
+        sections["store"] = len(system_prompt) - sum(sections.values())
+        trace.sections = sections
+    llm.warm_up()  # first use imports the SDK; keep that off the event loop too
+    return None, system_prompt, cache_key
+
+
+def _backoff(attempt: int) -> float:
+    """Exponential delay with jitter, so retries of concurrent requests spread out"""
+    return CHAT_LLM_RETRY_DELAY * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def _finish(reply: str, cache_key) -> str:
+    if cache_key is not None:
+        response_cache.put(cache_key, reply)
+    return reply
+
+
+def _remember(session_id: str, user_message: str, reply: str):
+    if session_id and reply not in _FALLBACKS:
+        conversations.record(session_id, user_message, reply)
+
+
+def history_for(session_id: str):
+    return conversations.context(session_id) if session_id else None
+
 
+def _record(trace: ChatTrace, reply: str):
+    if trace.outcome is None:
+        trace.outcome = "fallback" if reply in _FALLBACKS else "llm"
+    telemetry.record(trace)
+
+
+def get_chat_response(db: Session, user_message: str, session_id: str = None) -> str:
+    """
+    Enhanced chatbot with better error handling, retry logic, and optimized context.
+    Blocking version for scripts; the API uses get_chat_response_async.
+    """
+    trace = ChatTrace()
+    reply, system_prompt, cache_key = prepare_chat(db, user_message, history_for(session_id), trace)
+    if reply is None:
+        reply = _generate(system_prompt, cache_key, trace)
+    _remember(session_id, user_message, reply)
+    _record(trace, reply)
+    return reply
+
+
+def _generate(system_prompt: str, cache_key, trace: ChatTrace) -> str:
+
+    for attempt in range(CHAT_LLM_MAX_RETRIES):
+        last_attempt = attempt == CHAT_LLM_MAX_RETRIES - 1
+        if not llm_breaker.allow():
+            return FALLBACK_ERROR
+        trace.attempts += 1
+        started = time.perf_counter()
+        try:
+            reply = llm.generate(system_prompt).strip()
         except Exception as e:
-            print(f"Gemini API Error (Attempt {attempt + 1}/{max_retries}): {e}")
-            
-            # If not last attempt, retry with backoff
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
-                retry_delay *= 2  # Exponential backoff
-                continue
-            
-            # Last attempt failed
-            return f"Sorry, main abhi kuch technical issue face kar raha hoon. Please {STORE_INFO['contact']} par contact karein. 🤖"
-    
-    return "Sorry, I am having trouble thinking right now. Please try again later."
+            trace.llm_seconds += time.perf_counter() - started
+            llm_breaker.record_failure()
+            print(f"LLM error ({llm.name}, attempt {attempt + 1}/{CHAT_LLM_MAX_RETRIES}): {e}")
+            if last_attempt:
+                return FALLBACK_ERROR
+            time.sleep(_backoff(attempt))
+            continue
+        except BaseException:
+            llm_breaker.release()
+            raise
+
+        trace.llm_seconds += time.perf_counter() - started
+        llm_breaker.record_success()
+        if reply:
+            return _finish(reply, cache_key)
+        if last_attempt:
+            return FALLBACK_EMPTY
+        time.sleep(_backoff(attempt))
+
+    return FALLBACK_ERROR
+
+
+class LLMLimiter:
+    """Caps concurrent outbound LLM calls from the event loop"""
+
+    def __init__(self, max_concurrency: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self._semaphore = None  # created on first use, inside the running loop
+        self.in_flight = 0
+        self.busy_rejections = 0
+        self.timeouts = 0
+
+    async def acquire(self) -> bool:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.busy_rejections += 1
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "busy_rejections": self.busy_rejections,
+            "timeouts": self.timeouts,
+        }
+
+
+llm_breaker = CircuitBreaker(failure_threshold=CHAT_LLM_BREAKER_FAILURES, reset_timeout=CHAT_LLM_BREAKER_RESET)
+llm_limiter = LLMLimiter(CHAT_LLM_MAX_CONCURRENCY, CHAT_LLM_QUEUE_TIMEOUT)
+
+
+async def get_chat_response_async(db: Session, user_message: str, session_id: str = None) -> str:
+    """
+    Same answers as get_chat_response without holding a thread: database work
+    runs in a worker thread, the Gemini call and the backoff are awaited.
+    `db` is closed once the prompt is built, so no pooled connection is held
+    while waiting on the LLM.
+    Fails fast with the fallback message while the circuit breaker is open.
+    """
+    trace = ChatTrace()
+    reply, system_prompt, cache_key = await asyncio.to_thread(
+        prepare_chat_and_release, db, user_message, history_for(session_id), trace
+    )
+    if reply is None:
+        reply = await _generate_async(system_prompt, cache_key, trace)
+    _remember(session_id, user_message, reply)
+    _record(trace, reply)
+    return reply
+
+
+async def _generate_async(system_prompt: str, cache_key, trace: ChatTrace) -> str:
+
+    for attempt in range(CHAT_LLM_MAX_RETRIES):
+        last_attempt = attempt == CHAT_LLM_MAX_RETRIES - 1
+        if llm_breaker.state == OPEN:
+            llm_breaker.allow()  # counts the rejection
+            return FALLBACK_ERROR
+        if not await llm_limiter.acquire():
+            return FALLBACK_BUSY
+        try:
+            if not llm_breaker.allow():
+                return FALLBACK_ERROR
+            trace.attempts += 1
+            started = time.perf_counter()
+            try:
+                reply = (await asyncio.wait_for(llm.generate_async(system_prompt), CHAT_LLM_TIMEOUT)).strip()
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    llm_limiter.timeouts += 1
+                llm_breaker.record_failure()
+                print(f"LLM error ({llm.name}, attempt {attempt + 1}/{CHAT_LLM_MAX_RETRIES}): {e!r}")
+                reply = None
+            except BaseException:
+                llm_breaker.release()  # cancelled (client gone): no outcome, but free a trial slot
+                raise
+            trace.llm_seconds += time.perf_counter() - started
+        finally:
+            llm_limiter.release()
+
+        if reply is None:
+            if last_attempt:
+                return FALLBACK_ERROR
+            await asyncio.sleep(_backoff(attempt))
+            continue
+
+        llm_breaker.record_success()
+        if reply:
+            return _finish(reply, cache_key)
+        if last_attempt:
+            return FALLBACK_EMPTY
+        await asyncio.sleep(_backoff(attempt))
+
+    return FALLBACK_ERROR
+
+
+async def _first_text(chunks) -> str:
+    """Text of the first non-empty chunk, "" if the stream ends without text"""
+    async for chunk in chunks:
+        text = chunk.lstrip()
+        if text:
+            return text
+    return ""
+
+
+async def stream_reply(prepared, trace: ChatTrace):
+    """
+    Async generator of reply text as Gemini produces it, for the result of
+    prepare_chat(). Retries, the concurrency cap and the circuit breaker all
+    act before the first chunk, so until then a failure still ends in the
+    usual fallback message; an error after text has been sent is raised.
+    """
+    reply, system_prompt, cache_key = prepared
+    if reply is not None:
+        yield reply
+        return
+
+    for attempt in range(CHAT_LLM_MAX_RETRIES):
+        last_attempt = attempt == CHAT_LLM_MAX_RETRIES - 1
+        if llm_breaker.state == OPEN:
+            llm_breaker.allow()  # counts the rejection
+            yield FALLBACK_ERROR
+            return
+        if not await llm_limiter.acquire():
+            yield FALLBACK_BUSY
+            return
+        chunks = llm.stream_async(system_prompt)  # nothing runs until iterated
+        started = time.perf_counter()
+        allowed = reported = False
+        try:
+            if not llm_breaker.allow():
+                yield FALLBACK_ERROR
+                return
+            allowed = True
+            trace.attempts += 1
+            try:
+                first = await asyncio.wait_for(_first_text(chunks), CHAT_LLM_TIMEOUT)
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    llm_limiter.timeouts += 1
+                llm_breaker.record_failure()
+                reported = True
+                print(f"LLM error ({llm.name}, attempt {attempt + 1}/{CHAT_LLM_MAX_RETRIES}): {e!r}")
+                first = None
+
+            if first:
+                parts = [first]
+                yield first
+                try:
+                    async for text in chunks:
+                        if text:
+                            parts.append(text)
+                            yield text
+                except Exception:
+                    llm_breaker.record_failure()
+                    reported = True
+                    raise
+                llm_breaker.record_success()
+                reported = True
+                _finish("".join(parts).strip(), cache_key)
+                return
+            if first is not None:
+                llm_breaker.record_success()  # reachable, but nothing usable came back
+                reported = True
+        finally:
+            if allowed and not reported:
+                # Cancelled, or the client went away mid-reply (GeneratorExit)
+                llm_breaker.release()
+            await chunks.aclose()
+            llm_limiter.release()
+            trace.llm_seconds += time.perf_counter() - started
+
+        if last_attempt:
+            yield FALLBACK_ERROR if first is None else FALLBACK_EMPTY
+            return
+        await asyncio.sleep(_backoff(attempt))
+
+
+async def stream_chat(prepared, user_message: str, session_id: str = None, trace: ChatTrace = None):
+    """stream_reply() that also adds the finished exchange to the session and records telemetry"""
+    trace = trace or ChatTrace()
+    parts = []
+    async for text in stream_reply(prepared, trace):
+        if not parts:
+            trace.mark_first_token()
+        parts.append(text)
+        yield text
+    reply = "".join(parts).strip()
+    _remember(session_id, user_message, reply)
+    _record(trace, reply)
+
@@ -0,0 +1,95 @@
+"""
+Circuit breaker for calls to an external service (the LLM provider)
+
+After `failure_threshold` consecutive failures the breaker opens and callers
+fail fast for `reset_timeout` seconds instead of queueing on a service that
+is down. Then one trial call is let through (half-open): success closes the
+breaker, failure opens it for another `reset_timeout`. A trial that ends with
+neither (cancelled) must call release(); one that never reports back at all
+stops blocking new trials after `trial_timeout` seconds.
+"""
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, trial_timeout: float = None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.trial_timeout = trial_timeout if trial_timeout is not None else reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_started = 0.0
+
+        self.rejected = 0
+        self.opened = 0
+        self.lost_trials = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go out now. Every allowed call must be reported
+        back: record_success(), record_failure(), or release() if it was
+        cancelled before an outcome.
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            now = time.monotonic()
+            if self._state == OPEN and now - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN and self._trial_in_flight \
+                    and now - self._trial_started >= self.trial_timeout:
+                self._trial_in_flight = False  # the trial never reported back
+                self.lost_trials += 1
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                self._trial_started = now
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.opened += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def release(self):
+        """An allowed call ended without an outcome (e.g. cancelled): free the trial slot"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def stats(self) -> dict:
+        state = self.state
+        with self._lock:
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "times_opened": self.opened,
+                "rejected": self.rejected,
+                "lost_trials": self.lost_trials,
+            }
@@ -0,0 +1,186 @@
+"""
+Server-side chat sessions with bounded memory
+
+Each session keeps its last CHAT_HISTORY_TURNS exchanges verbatim. Older
+turns are folded into a short extractive summary (the first sentence of each
+question and answer), capped at CHAT_SUMMARY_CHARS by dropping the oldest
+lines, so the history part of the prompt has a fixed upper size however long
+the conversation runs.
+
+Sessions idle for CHAT_SESSION_IDLE_SECONDS are dropped, and least recently
+used sessions are dropped whenever the store goes over CHAT_SESSIONS_MAX_BYTES.
+The store is per process (like the catalog cache); a session that lands on
+another worker simply starts without history.
+"""
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import NamedTuple, Optional, Tuple
+
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", "4"))
+CHAT_TURN_CHARS = int(os.getenv("CHAT_TURN_CHARS", "500"))
+CHAT_SUMMARY_CHARS = int(os.getenv("CHAT_SUMMARY_CHARS", "600"))
+CHAT_SESSION_IDLE_SECONDS = float(os.getenv("CHAT_SESSION_IDLE_SECONDS", "1800"))
+CHAT_SESSIONS_MAX_BYTES = int(os.getenv("CHAT_SESSIONS_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# Rough per-turn / per-session bookkeeping cost on top of the text itself
+_TURN_OVERHEAD = 200
+_SESSION_OVERHEAD = 600
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+_WORD = re.compile(r"\w+")
+
+# Words that point back at something said earlier (English and Roman Urdu)
+FOLLOW_UP_WORDS = frozenset("""
+it its this that these those they them their one ones other others another same else
+cheaper costlier bigger smaller better previous above also too both either
+ye yeh wo woh iska iski uska uski inka unka isme usme isse usse dono wala wali wale
+""".split())
+_SENTENCE_END = re.compile(r"(?<=[.!?؟])\s")
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def first_sentence(text: str, limit: int = 120) -> str:
+    return _clip(_SENTENCE_END.split(" ".join(text.split()), 1)[0], limit)
+
+
+class ConversationContext(NamedTuple):
+    summary: Tuple[str, ...]
+    turns: Tuple[Tuple[str, str], ...]  # (user, assistant), oldest first
+
+    @property
+    def last_user_message(self) -> str:
+        return self.turns[-1][0] if self.turns else ""
+
+
+class _Session:
+    __slots__ = ("turns", "summary", "summary_chars", "last_used", "size")
+
+    def __init__(self):
+        self.turns = deque()
+        self.summary = deque()
+        self.summary_chars = 0
+        self.last_used = time.monotonic()
+        self.size = _SESSION_OVERHEAD
+
+
+class ConversationStore:
+    def __init__(self, max_turns: int = CHAT_HISTORY_TURNS, idle_seconds: float = CHAT_SESSION_IDLE_SECONDS,
+                 max_bytes: int = CHAT_SESSIONS_MAX_BYTES, summary_chars: int = CHAT_SUMMARY_CHARS):
+        self.max_turns = max_turns
+        self.idle_seconds = idle_seconds
+        self.max_bytes = max_bytes
+        self.summary_chars = summary_chars
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()  # session id -> _Session, least recently used first
+        self._bytes = 0
+
+        self.evicted_idle = 0
+        self.evicted_memory = 0
+
+    @staticmethod
+    def session_id(requested: Optional[str]) -> str:
+        """The client's session id if it is well-formed, else a new one"""
+        if requested and _SESSION_ID.match(requested):
+            return requested
+        return uuid.uuid4().hex
+
+    def _evict(self, now: float):
+        # Oldest first, so stop at the first session that is still active
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used < self.idle_seconds:
+                break
+            self._drop(session_id)
+            self.evicted_idle += 1
+        while self._bytes > self.max_bytes and len(self._sessions) > 1:
+            self._drop(next(iter(self._sessions)))
+            self.evicted_memory += 1
+
+    def _drop(self, session_id: str):
+        session = self._sessions.pop(session_id)
+        self._bytes -= session.size
+
+    def context(self, session_id: str) -> Optional[ConversationContext]:
+        """History of `session_id` for the prompt, None if it has none"""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            session = self._sessions.get(session_id)
+            if session is None or not (session.turns or session.summary):
+                return None
+            session.last_used = now
+            self._sessions.move_to_end(session_id)
+            return ConversationContext(tuple(session.summary), tuple(session.turns))
+
+    def record(self, session_id: str, user_message: str, reply: str):
+        """Append one exchange, folding whatever leaves the window into the summary"""
+        user_message, reply = _clip(user_message, CHAT_TURN_CHARS), _clip(reply, CHAT_TURN_CHARS)
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session()
+                self._bytes += session.size
+            self._sessions.move_to_end(session_id)
+            session.last_used = now
+
+            before = session.size
+            session.turns.append((user_message, reply))
+            session.size += len(user_message) + len(reply) + _TURN_OVERHEAD
+            while len(session.turns) > self.max_turns:
+                old_user, old_reply = session.turns.popleft()
+                session.size -= len(old_user) + len(old_reply) + _TURN_OVERHEAD
+                line = f"User asked: {first_sentence(old_user)} → {first_sentence(old_reply)}"
+                session.summary.append(line)
+                session.summary_chars += len(line)
+                session.size += len(line)
+                while session.summary_chars > self.summary_chars and len(session.summary) > 1:
+                    dropped = session.summary.popleft()
+                    session.summary_chars -= len(dropped)
+                    session.size -= len(dropped)
+            self._bytes += session.size - before
+            self._evict(now)
+
+    def forget(self, session_id: str):
+        with self._lock:
+            if session_id in self._sessions:
+                self._drop(session_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "approx_bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evicted_idle": self.evicted_idle,
+                "evicted_memory": self.evicted_memory,
+            }
+
+
+def is_follow_up(message: str) -> bool:
+    """
+    Whether `message` may lean on the conversation ("and the cheaper one?").
+    Very short messages ("price?") count too. Anything else is answered the
+    same with or without history.
+    """
+    words = _WORD.findall(message.lower())
+    return len(words) < 3 or any(w in FOLLOW_UP_WORDS for w in words)
+
+
+def render_history(context: ConversationContext) -> str:
+    """Conversation section of the prompt"""
+    parts = []
+    if context.summary:
+        parts.append("Earlier in this conversation:\n")
+        parts.extend(f"• {line}\n" for line in context.summary)
+    for user_message, reply in context.turns:
+        parts.append(f"User: {user_message}\nYou: {reply}\n")
+    return "".join(parts)
@@ -1,23 +1,278 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, joinedload, selectinload
+from datetime import datetime
+from typing import List
+import base64
+import json
+from pydantic import ValidationError
 import models, schemas
+import forecast_models
+import versioning
+from catalog_cache import CatalogSnapshot, catalog
 
-def get_product(db: Session, product_id: int):
-    return db.query(models.Product).filter(models.Product.id == product_id).first()
+
+# --- Keyset pagination ---
+
+def encode_cursor(values: dict) -> str:
+    """Pack the sort key of the last row of a page into an opaque token."""
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> dict:
+    """Inverse of encode_cursor. Raises ValueError for malformed tokens."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, dict):
+        raise ValueError("Invalid cursor")
+    return values
+
+def get_product(db: Session, product_id: int, snapshot: CatalogSnapshot = None):
+    if snapshot is None:
+        snapshot = catalog.snapshot(db)
+    return snapshot.get(product_id)
 
 def get_products(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Product).offset(skip).limit(limit).all()
 
+def get_products_page(db: Session, cursor: str = None, limit: int = 100, skip: int = 0, category: str = None,
+                      snapshot: CatalogSnapshot = None):
+    """
+    Page through products in id order, served from the catalog cache
+    (or from `snapshot`, if the caller already has one).
+    Returns (products, next_cursor); next_cursor is None on the last page.
+    `skip` is only honoured when no cursor is given (legacy offset paging).
+    """
+    after_id = None
+    if cursor:
+        last = decode_cursor(cursor)
+        try:
+            after_id = int(last["id"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+
+    # Fetch one extra row to find out whether another page exists
+    if snapshot is None:
+        snapshot = catalog.snapshot(db)
+    rows = snapshot.page(after_id=after_id, skip=skip, limit=limit + 1, category=category)
+    products = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit and products:
+        next_cursor = encode_cursor({"id": products[-1].id})
+    return products, next_cursor
+
 def create_product(db: Session, product: schemas.ProductCreate):
     db_product = models.Product(**product.dict())
     db.add(db_product)
+    db.flush()
+    versioning.bump(db, versioning.PRODUCTS)
+    versioning.log_product_changes(db, [db_product.id])
     db.commit()
     db.refresh(db_product)
     return db_product
 
+def update_product(db: Session, product_id: int, product: schemas.ProductCreate):
+    db_product = db.query(models.Product).filter(models.Product.id == product_id).first()
+    if not db_product:
+        return None
+
+    # Basic cleanup: remove trailing/leading spaces from name
+    if product.name:
+        product.name = product.name.strip()
+
+    values = product.dict()
+    if "sku" not in product.__fields_set__:
+        values.pop("sku")  # forms that don't know about SKUs must not clear them
+    for key, value in values.items():
+        setattr(db_product, key, value)
+
+    versioning.bump(db, versioning.PRODUCTS)
+    versioning.log_product_changes(db, [product_id])
+    db.commit()
+    db.refresh(db_product)
+    return db_product
+
+def delete_product(db: Session, product_id: int):
+    db_product = db.query(models.Product).filter(models.Product.id == product_id).first()
+    if not db_product:
+        return False
+
+    db.delete(db_product)
+    versioning.bump(db, versioning.PRODUCTS)
+    versioning.log_product_changes(db, [product_id])
+    db.commit()
+    return True
+
+PRODUCT_FEED_FIELDS = ("name", "description", "price", "stock_quantity", "category", "image_url")
+PRODUCT_REQUIRED_FIELDS = ("name", "price", "category")
+BULK_CHUNK_SIZE = 500
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in error.errors())
+
+def bulk_upsert_products(db: Session, records, chunk_size: int = BULK_CHUNK_SIZE) -> dict:
+    """
+    Insert or update products matched on `sku`, from (line, record, error)
+    tuples as produced by feeds.parse_feed().
+
+    Each chunk costs one SELECT for the existing rows and one
+    INSERT .. ON CONFLICT(sku) DO UPDATE for the rows that changed. Fields a
+    record leaves out keep their current value. The whole feed is committed
+    at once, with a single version bump and cache invalidation.
+    """
+    results = []
+    valid = []
+    seen = set()
+    for line, record, error in records:
+        raw_sku = record.get("sku") if record else None
+        sku = raw_sku.strip() if isinstance(raw_sku, str) else None
+        if error is None and (raw_sku is None or sku == ""):
+            error = "sku is required"  # missing, null or blank
+        elif error is None and sku is None:
+            error = f"sku must be a string, got {type(raw_sku).__name__}"
+        if error is None:
+            try:
+                row = schemas.ProductFeedRow(**record)
+            except ValidationError as e:
+                error = _validation_message(e)
+        if error is None and sku in seen:
+            error = "Duplicate sku in feed"
+        if error is not None:
+            results.append({"line": line, "sku": sku or None, "status": "error", "error": error})
+            continue
+        seen.add(sku)
+        valid.append((line, sku, row.dict(exclude_unset=True)))
+
+    table = models.Product.__table__
+    changed_ids = []
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start:start + chunk_size]
+        existing = {
+            row.sku: row for row in db.execute(
+                select(table.c.id, table.c.sku, *[table.c[f] for f in PRODUCT_FEED_FIELDS])
+                .where(table.c.sku.in_([sku for _, sku, _ in chunk]))
+            )
+        }
+
+        upserts, pending = [], []
+        for line, sku, fields in chunk:
+            fields.pop("sku", None)
+            if fields.get("name"):
+                fields["name"] = fields["name"].strip()
+            current = existing.get(sku)
+            if current is None:
+                values = {f: None for f in PRODUCT_FEED_FIELDS}
+                values["stock_quantity"] = 0
+            else:
+                values = {f: current._mapping[f] for f in PRODUCT_FEED_FIELDS}
+            values.update(fields)
+
+            missing = [f for f in PRODUCT_REQUIRED_FIELDS if values[f] is None]
+            if missing:
+                results.append({"line": line, "sku": sku, "status": "error",
+                                "error": f"Missing required field(s): {', '.join(missing)}"})
+            elif current is not None and all(values[f] == current._mapping[f] for f in PRODUCT_FEED_FIELDS):
+                results.append({"line": line, "sku": sku, "status": "unchanged", "id": current.id})
+            else:
+                upserts.append(dict(values, sku=sku))
+                pending.append((line, sku, "updated" if current is not None else "created"))
+
+        if upserts:
+            stmt = sqlite_insert(table).values(upserts)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.sku],
+                set_={f: stmt.excluded[f] for f in PRODUCT_FEED_FIELDS}
+            ).returning(table.c.id, table.c.sku)
+            ids = {sku: product_id for product_id, sku in db.execute(stmt)}
+            for line, sku, status in pending:
+                results.append({"line": line, "sku": sku, "status": status, "id": ids[sku]})
+                changed_ids.append(ids[sku])
+
+    if changed_ids:
+        versioning.bump(db, versioning.PRODUCTS)
+        versioning.log_product_changes(db, changed_ids)
+        db.commit()
+
+    results.sort(key=lambda r: r["line"])
+    counts = {status: 0 for status in ("created", "updated", "unchanged", "error")}
+    for r in results:
+        counts[r["status"]] += 1
+    return {
+        "created": counts["created"],
+        "updated": counts["updated"],
+        "unchanged": counts["unchanged"],
+        "failed": counts["error"],
+        "rows": results,
+    }
+
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
 
+EMAIL_PREFIX_MIN_LENGTH = 3
+
+def get_orders_page(db: Session, cursor: str = None, limit: int = 100, skip: int = 0,
+                    status: str = None, customer_email: str = None, email_prefix: str = None,
+                    created_from: datetime = None, created_to: datetime = None):
+    """
+    Page through orders newest first, keyed on (created_at, id).
+    Returns (orders, next_cursor); next_cursor is None on the last page.
+    `skip` is only honoured when no cursor is given (legacy offset paging).
+    Emails match case-insensitively; `email_prefix` is a range scan on the same index.
+    A prefix range is not in (created_at, id) order, so every matching order is
+    sorted before the limit applies: prefixes shorter than EMAIL_PREFIX_MIN_LENGTH
+    are rejected to keep that set small.
+    """
+    query = db.query(models.Order).options(selectinload(models.Order.items))
+    if status:
+        query = query.filter(models.Order.status == status)
+    if customer_email:
+        query = query.filter(func.lower(models.Order.customer_email) == customer_email.strip().lower())
+    elif email_prefix:
+        prefix = email_prefix.strip().lower()
+        if len(prefix) < EMAIL_PREFIX_MIN_LENGTH:
+            raise ValueError(f"email_prefix must be at least {EMAIL_PREFIX_MIN_LENGTH} characters")
+        query = query.filter(func.lower(models.Order.customer_email) >= prefix,
+                             func.lower(models.Order.customer_email) < prefix + "\uffff")
+    if created_from:
+        query = query.filter(models.Order.created_at >= created_from)
+    if created_to:
+        query = query.filter(models.Order.created_at < created_to)
+
+    if cursor:
+        last = decode_cursor(cursor)
+        try:
+            last_created = datetime.fromisoformat(last["created_at"])
+            last_id = int(last["id"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+        # A row-value comparison lets SQLite seek straight to the cursor in
+        # the (…, created_at, id) indexes; the equivalent OR does not
+        query = query.filter(tuple_(models.Order.created_at, models.Order.id) < (last_created, last_id))
+    elif skip:
+        query = query.offset(skip)
+
+    rows = query.order_by(models.Order.created_at.desc(), models.Order.id.desc()).limit(limit + 1).all()
+    orders = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit and orders:
+        last_order = orders[-1]
+        next_cursor = encode_cursor({
+            "created_at": last_order.created_at.isoformat(),
+            "id": last_order.id,
+        })
+    return orders, next_cursor
+
+
+def get_customer_orders(db: Session, email: str, status: str = None, limit: int = 5):
+    """A customer's most recent orders, newest first (one query on the email index)"""
+    orders, _ = get_orders_page(db, limit=limit, status=status, customer_email=email)
+    return orders
+
+
 def update_order_status(db: Session, order_id: int, status: str):
     db_order = db.query(models.Order).filter(models.Order.id == order_id).first()
     if db_order:
@@ -26,10 +281,79 @@ def update_order_status(db: Session, order_id: int, status: str):
         db.refresh(db_order)
     return db_order
 
+# Allowed moves for bulk status changes; delivered and cancelled are final
+ORDER_STATUS_TRANSITIONS = {
+    "pending": {"processing", "shipped", "delivered", "cancelled"},
+    "processing": {"shipped", "delivered", "cancelled"},
+    "shipped": {"delivered"},
+    "delivered": set(),
+    "cancelled": set(),
+}
+BULK_STATUS_CHUNK_SIZE = 5000
+
+def bulk_update_order_status(db: Session, status: str, ids: List[int] = None,
+                             status_from: str = None, created_from: datetime = None, created_to: datetime = None):
+    """
+    Move many orders to `status` with set-based UPDATEs, in one transaction.
+
+    Either pass `ids` (orders that don't exist or can't make the transition
+    are reported back as rejected), or filter by current status and/or
+    creation date, in which case only orders allowed to make the transition
+    are matched. Raises ValueError for invalid requests.
+    """
+    if status not in ORDER_STATUS_TRANSITIONS:
+        raise ValueError(f"Unknown status: {status}")
+    allowed_from = [s for s, targets in ORDER_STATUS_TRANSITIONS.items() if status in targets]
+    orders = models.Order.__table__
+
+    if ids is not None:
+        if status_from or created_from or created_to:
+            raise ValueError("Pass either ids or a filter, not both")
+        ids = list(dict.fromkeys(ids))
+        updated = set()
+        for start in range(0, len(ids), BULK_STATUS_CHUNK_SIZE):
+            chunk = ids[start:start + BULK_STATUS_CHUNK_SIZE]
+            stmt = orders.update().where(orders.c.id.in_(chunk), orders.c.status.in_(allowed_from)) \
+                .values(status=status).returning(orders.c.id)
+            updated.update(row.id for row in db.execute(stmt))
+        db.commit()
+
+        missed = [i for i in ids if i not in updated]
+        current = {}
+        for start in range(0, len(missed), BULK_STATUS_CHUNK_SIZE):
+            chunk = missed[start:start + BULK_STATUS_CHUNK_SIZE]
+            current.update(db.execute(select(orders.c.id, orders.c.status).where(orders.c.id.in_(chunk))).all())
+        rejected = [
+            {"id": i, "status": current[i], "reason": f"Cannot move from {current[i]} to {status}"}
+            if i in current else {"id": i, "status": None, "reason": "Order not found"}
+            for i in missed
+        ]
+        return {"status": status, "updated": len(updated), "rejected": rejected}
+
+    if not (status_from or created_from or created_to):
+        raise ValueError("Pass ids or a filter with at least one of status, created_from, created_to")
+    if status_from and status_from not in allowed_from:
+        raise ValueError(f"Cannot move orders from {status_from} to {status}")
+
+    stmt = orders.update().values(status=status)
+    stmt = stmt.where(orders.c.status == status_from) if status_from else stmt.where(orders.c.status.in_(allowed_from))
+    if created_from:
+        stmt = stmt.where(orders.c.created_at >= created_from)
+    if created_to:
+        stmt = stmt.where(orders.c.created_at < created_to)
+    updated = db.execute(stmt).rowcount
+    db.commit()
+    return {"status": status, "updated": updated, "rejected": []}
+
 def create_order(db: Session, order: schemas.OrderCreate):
-    # 1. Deduct stock and validate availability
+    # 1. Deduct stock and validate availability (one query for all lines)
+    product_ids = {item.product_id for item in order.items}
+    products = {
+        p.id: p for p in
+        db.query(models.Product).filter(models.Product.id.in_(product_ids)).all()
+    }
     for item in order.items:
-        product = db.query(models.Product).filter(models.Product.id == item.product_id).first()
+        product = products.get(item.product_id)
         if not product:
             raise Exception(f"Product {item.product_id} not found")
         if product.stock_quantity < item.quantity:
@@ -46,20 +370,22 @@ def create_order(db: Session, order: schemas.OrderCreate):
         status="pending"
     )
     db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
+    db.flush()
 
     # 3. Create Order Items
     for item in order.items:
-        product = db.query(models.Product).filter(models.Product.id == item.product_id).first()
         db_item = models.OrderItem(
             order_id=db_order.id,
             product_id=item.product_id,
             quantity=item.quantity,
-            price_at_purchase=product.price
+            price_at_purchase=products[item.product_id].price
         )
         db.add(db_item)
     
+    # Stock is part of the /products/ and predictions responses, so their
+    # ETags must change; catalog caches reload just these products
+    versioning.bump(db, versioning.PRODUCTS)
+    versioning.log_product_changes(db, product_ids)
     db.commit()
     db.refresh(db_order)
     return db_order
@@ -77,3 +403,89 @@ def delete_order(db: Session, order_id: int):
     db.delete(db_order)
     db.commit()
     return True
+
+
+# --- Forecast reads ---
+
+def _prediction_dict(forecast_date: datetime, demand: float, lower: float, upper: float, model_used: str) -> dict:
+    return {
+        "date": forecast_date.isoformat(),
+        "predicted_demand": demand,
+        "confidence_lower": lower,
+        "confidence_upper": upper,
+        "model_used": model_used
+    }
+
+def load_forecasts(db: Session, product_id: int = None) -> dict:
+    """
+    Map of product id -> predictions ordered by date, for one product or all.
+    Reads both storage formats (see forecast_models.FORECAST_STORAGE); a
+    product's latest run lives in exactly one of them.
+    """
+    forecast_map = {}
+    packed = db.query(forecast_models.PackedForecast)
+    if product_id is not None:
+        packed = packed.filter(forecast_models.PackedForecast.product_id == product_id)
+    for row in packed:
+        forecast_map[row.product_id] = [_prediction_dict(*day, row.model_used) for day in row.days()]
+
+    if product_id is not None and product_id in forecast_map:
+        return forecast_map
+
+    rows = db.query(forecast_models.DemandForecast)
+    if product_id is not None:
+        rows = rows.filter(forecast_models.DemandForecast.product_id == product_id)
+    packed_ids = set(forecast_map)
+    for f in rows.order_by(forecast_models.DemandForecast.product_id, forecast_models.DemandForecast.forecast_date):
+        if f.product_id not in packed_ids:
+            forecast_map.setdefault(f.product_id, []).append(_prediction_dict(
+                f.forecast_date, f.predicted_demand, f.confidence_lower, f.confidence_upper, f.model_used
+            ))
+    return forecast_map
+
+def get_all_predictions(db: Session, snapshot: CatalogSnapshot = None):
+    """Predictions for all products, with an empty list for those without history"""
+    # 1. Get ALL products first
+    products = (snapshot if snapshot is not None else catalog.snapshot(db)).products
+
+    # 2. Get ALL forecasts, grouped by product
+    forecast_map = load_forecasts(db)
+
+    # 3. Construct response including ALL products
+    return [{
+        "product_id": product.id,
+        "product_name": product.name,
+        "current_stock": product.stock_quantity,
+        "predictions": forecast_map.get(product.id, [])  # Empty list if no forecasts
+    } for product in products]
+
+def get_product_predictions(db: Session, product_id: int, snapshot: CatalogSnapshot = None):
+    """Predictions for one product, or None if the product does not exist"""
+    product = get_product(db, product_id, snapshot)
+    if not product:
+        return None
+
+    return {
+        "product_id": product_id,
+        "product_name": product.name,
+        "current_stock": product.stock_quantity,
+        "predictions": load_forecasts(db, product_id).get(product_id, [])
+    }
+
+def get_active_alerts(db: Session):
+    alerts = db.query(forecast_models.StockAlert).options(
+        joinedload(forecast_models.StockAlert.product)
+    ).filter(
+        forecast_models.StockAlert.status == "active"
+    ).order_by(forecast_models.StockAlert.alert_type).all()
+
+    return [{
+        "id": a.id,
+        "product_id": a.product_id,
+        "product_name": a.product.name if a.product else "Unknown",
+        "alert_type": a.alert_type,
+        "message": a.message,
+        "recommended_order_qty": a.recommended_order_qty,
+        "days_until_stockout": a.days_until_stockout,
+        "created_at": a.created_at.isoformat()
+    } for a in alerts]
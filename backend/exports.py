@@ -0,0 +1,176 @@
+"""
+Streaming CSV / NDJSON exports of orders, products and forecasts
+
+Each export runs on its own read-pool connection for as long as the download
+lasts (not the request-scoped session, which is closed before the body has
+been sent) and pulls rows in chunks of EXPORT_CHUNK_SIZE, so memory stays
+flat whatever the size of the result and the first bytes go out immediately.
+"""
+import csv
+import io
+import itertools
+import json
+import os
+from datetime import datetime
+from typing import Iterator, Optional
+from sqlalchemy import select, union_all
+import models
+import forecast_models
+from database import read_engine
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "2000"))
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+ORDER_COLUMNS = ["order_id", "created_at", "status", "customer_name", "customer_email", "shipping_address",
+                 "total_amount"]
+ITEM_COLUMNS = ["item_id", "product_id", "quantity", "price_at_purchase"]
+PRODUCT_COLUMNS = ["id", "sku", "name", "description", "price", "stock_quantity", "category", "image_url"]
+FORECAST_COLUMNS = ["id", "product_id", "product_name", "forecast_date", "predicted_demand",
+                    "confidence_lower", "confidence_upper", "model_used", "created_at"]
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _partitions(stmt, chunk_size: int):
+    """Yield lists of rows from `stmt`, `chunk_size` at a time"""
+    with read_engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(stmt)
+        for partition in result.partitions():
+            yield partition
+
+
+def _encode(columns: list, chunks, fmt: str) -> Iterator[str]:
+    """Encode chunks of row tuples (in `columns` order) as CSV or NDJSON text"""
+    buffer = io.StringIO()
+    if fmt == "csv":
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for rows in chunks:
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    else:
+        for rows in chunks:
+            for row in rows:
+                buffer.write(json.dumps(dict(zip(columns, row)), default=_json_default))
+                buffer.write("\n")
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+
+def _order_rows(orders, items, status, created_from, created_to):
+    stmt = select(
+        orders.c.id.label("order_id"), orders.c.created_at, orders.c.status, orders.c.customer_name,
+        orders.c.customer_email, orders.c.shipping_address, orders.c.total_amount,
+        items.c.id.label("item_id"), items.c.product_id, items.c.quantity, items.c.price_at_purchase,
+    ).select_from(orders.outerjoin(items, items.c.order_id == orders.c.id))
+    if status:
+        stmt = stmt.where(orders.c.status == status)
+    if created_from:
+        stmt = stmt.where(orders.c.created_at >= created_from)
+    if created_to:
+        stmt = stmt.where(orders.c.created_at < created_to)
+    return stmt
+
+
+def export_orders(fmt: str, status: Optional[str] = None, created_from: Optional[datetime] = None,
+                  created_to: Optional[datetime] = None, include_archived: bool = True,
+                  chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Orders with their items, oldest first. CSV has one line per item (order
+    columns repeated); NDJSON has one object per order with an `items` list.
+
+    Archived orders (see archive.py) are included unless `include_archived`
+    is off. Both tables are read in one statement, so an archive run during
+    the download can neither drop nor repeat an order.
+    """
+    stmt = _order_rows(models.Order.__table__, models.OrderItem.__table__, status, created_from, created_to)
+    if include_archived:
+        stmt = union_all(
+            _order_rows(models.ArchivedOrder.__table__, models.ArchivedOrderItem.__table__,
+                        status, created_from, created_to),
+            stmt,
+        )
+    # Ordered like ix_orders_created_at_id / ix_orders_status_created_at_id,
+    # so SQLite walks an index instead of sorting the whole result first
+    stmt = stmt.order_by(stmt.selected_columns.created_at, stmt.selected_columns.order_id)
+
+    chunks = _partitions(stmt, chunk_size)
+    if fmt == "csv":
+        yield from _encode(ORDER_COLUMNS + ITEM_COLUMNS, chunks, fmt)
+        return
+
+    n_order = len(ORDER_COLUMNS)
+    current = None
+    buffer = io.StringIO()
+    for rows in chunks:
+        for row in rows:
+            if current is None or current["order_id"] != row[0]:
+                if current is not None:
+                    buffer.write(json.dumps(current, default=_json_default))
+                    buffer.write("\n")
+                current = dict(zip(ORDER_COLUMNS, row[:n_order]))
+                current["items"] = []
+            if row[n_order] is not None:
+                current["items"].append(dict(zip(ITEM_COLUMNS, row[n_order:])))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if current is not None:
+        yield json.dumps(current, default=_json_default) + "\n"
+
+
+def export_products(fmt: str, category: Optional[str] = None,
+                    chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[str]:
+    products = models.Product.__table__
+    stmt = select(*[products.c[name] for name in PRODUCT_COLUMNS]).order_by(products.c.id)
+    if category:
+        stmt = stmt.where(products.c.category == category)
+    return _encode(PRODUCT_COLUMNS, _partitions(stmt, chunk_size), fmt)
+
+
+def export_forecasts(fmt: str, product_id: Optional[int] = None,
+                     chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[str]:
+    forecasts = forecast_models.DemandForecast.__table__
+    products = models.Product.__table__
+    stmt = select(
+        forecasts.c.id, forecasts.c.product_id, products.c.name, forecasts.c.forecast_date,
+        forecasts.c.predicted_demand, forecasts.c.confidence_lower, forecasts.c.confidence_upper,
+        forecasts.c.model_used, forecasts.c.created_at,
+    ).select_from(forecasts.outerjoin(products, products.c.id == forecasts.c.product_id)) \
+        .order_by(forecasts.c.id)
+    if product_id is not None:
+        stmt = stmt.where(forecasts.c.product_id == product_id)
+    chunks = itertools.chain(_partitions(stmt, chunk_size), _packed_forecast_chunks(product_id, chunk_size))
+    return _encode(FORECAST_COLUMNS, chunks, fmt)
+
+
+def _packed_forecast_chunks(product_id: Optional[int], chunk_size: int):
+    """PackedForecast rows expanded to one row per day (without a row id)"""
+    packed = forecast_models.PackedForecast.__table__
+    products = models.Product.__table__
+    stmt = select(
+        packed.c.product_id, products.c.name, packed.c.start_date, packed.c.horizon, packed.c.predicted_demand,
+        packed.c.confidence_lower, packed.c.confidence_upper, packed.c.model_used, packed.c.created_at,
+    ).select_from(packed.outerjoin(products, products.c.id == packed.c.product_id)).order_by(packed.c.product_id)
+    if product_id is not None:
+        stmt = stmt.where(packed.c.product_id == product_id)
+    for partition in _partitions(stmt, max(1, chunk_size // 30)):
+        yield [
+            (None, r.product_id, r.name, *day, r.model_used, r.created_at)
+            for r in partition
+            for day in forecast_models.expand_packed(r.start_date, r.horizon, r.predicted_demand,
+                                                     r.confidence_lower, r.confidence_upper)
+        ]
@@ -0,0 +1,58 @@
+"""
+Parsing of uploaded CSV / NDJSON feeds (the counterpart of exports.py)
+"""
+import csv
+import io
+import json
+from typing import Iterator, Optional, Tuple
+
+FORMATS = ("csv", "ndjson")
+
+_CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+def detect_format(content_type: Optional[str], format: Optional[str] = None) -> str:
+    """Explicit `format` wins, then the Content-Type header. Raises ValueError."""
+    if format is None and content_type:
+        format = _CONTENT_TYPES.get(content_type.split(";")[0].strip().lower())
+    if format not in FORMATS:
+        raise ValueError("Send the feed as text/csv or application/x-ndjson (or pass ?format=csv|ndjson)")
+    return format
+
+
+def parse_feed(body: bytes, fmt: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """
+    Yield (line, record, error) for every record in the feed. Empty CSV cells
+    are left out of the record, so they mean "not provided" rather than null.
+    Raises ValueError if the feed as a whole is unreadable.
+    """
+    text = body.decode("utf-8-sig")
+    if fmt == "csv":
+        reader = csv.DictReader(io.StringIO(text))
+        try:
+            for record in reader:
+                cleaned = {k.strip(): v.strip() for k, v in record.items()
+                           if k and isinstance(v, str) and v.strip()}
+                yield reader.line_num, cleaned, None
+        except csv.Error as e:
+            raise ValueError(f"Malformed CSV near line {reader.line_num}: {e}")
+        return
+
+    for line, raw in enumerate(text.splitlines(), start=1):
+        if not raw.strip():
+            continue
+        try:
+            record = json.loads(raw)
+        except ValueError as e:
+            yield line, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line, None, "Expected a JSON object"
+            continue
+        yield line, record, None
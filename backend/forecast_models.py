@@ -1,8 +1,16 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+import os
+import sys
+from array import array
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index, LargeBinary
 from sqlalchemy.orm import relationship
-from datetime import datetime
+from datetime import datetime, timedelta
 from database import Base
 
+# How save_forecasts() stores a training run: "rows" (one DemandForecast row
+# per day) or "packed" (one PackedForecast row per product). Readers handle
+# both, so the setting can be flipped without migrating old forecasts.
+FORECAST_STORAGE = os.getenv("FORECAST_STORAGE", "rows")
+
 class DemandForecast(Base):
     """Stores ML-generated demand predictions for products"""
     __tablename__ = "demand_forecasts"
@@ -20,6 +28,52 @@ class DemandForecast(Base):
     product = relationship("Product")
 
 
+def pack_floats(values) -> bytes:
+    """Little-endian float32 array, whatever the host byte order"""
+    packed = array("f", values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_floats(blob: bytes) -> array:
+    values = array("f")
+    values.frombytes(blob)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def expand_packed(start_date: datetime, horizon: int, demand: bytes, lower: bytes, upper: bytes) -> list:
+    """(forecast_date, predicted_demand, confidence_lower, confidence_upper) per day of a packed horizon"""
+    demand, lower, upper = unpack_floats(demand), unpack_floats(lower), unpack_floats(upper)
+    return [
+        (start_date + timedelta(days=i), round(demand[i], 4), round(lower[i], 4), round(upper[i], 4))
+        for i in range(horizon)
+    ]
+
+
+class PackedForecast(Base):
+    """
+    Latest forecast horizon of a product in one row: demand and confidence
+    bounds as packed float32 arrays, day i being start_date + i days
+    """
+    __tablename__ = "demand_forecasts_packed"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    start_date = Column(DateTime)
+    horizon = Column(Integer)
+    predicted_demand = Column(LargeBinary)
+    confidence_lower = Column(LargeBinary)
+    confidence_upper = Column(LargeBinary)
+    model_used = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def days(self) -> list:
+        return expand_packed(self.start_date, self.horizon, self.predicted_demand,
+                             self.confidence_lower, self.confidence_upper)
+
+
 class StockAlert(Base):
     """Stores inventory alerts based on predictions"""
     __tablename__ = "stock_alerts"
@@ -49,3 +103,8 @@ class SalesHistory(Base):
     
     # Relationship
     product = relationship("Product")
+
+    # One row per product and day; archive.py folds archived orders into it
+    __table_args__ = (
+        Index("ux_sales_history_product_date", "product_id", "date", unique=True),
+    )
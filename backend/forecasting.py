@@ -9,15 +9,19 @@ from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 from sklearn.model_selection import train_test_split, GridSearchCV, TimeSeriesSplit
 from sqlalchemy.orm import Session
+import crud
 import models
 import forecast_models
+import versioning
 
 
 class DemandForecaster:
     """ML-based demand forecasting for inventory management"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, read_db: Session = None):
         self.db = db
+        # History scans can run on the read-only pool so they never hold the writer
+        self.read_db = read_db if read_db is not None else db
         self.lr_model = LinearRegression()
         self.rf_model = RandomForestRegressor(n_estimators=100, max_depth=10, random_state=42)
         self.best_model = None
@@ -31,7 +35,7 @@ class DemandForecaster:
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
         # Query order items for this product
-        order_items = self.db.query(
+        order_items = self.read_db.query(
             models.OrderItem
         ).join(
             models.Order
@@ -47,6 +51,16 @@ class DemandForecaster:
             if date not in sales_by_date:
                 sales_by_date[date] = 0
             sales_by_date[date] += item.quantity
+
+        # Archived days (see archive.py) only survive as daily rollups
+        archived = self.read_db.query(
+            forecast_models.SalesHistory.date, forecast_models.SalesHistory.quantity_sold
+        ).filter(
+            forecast_models.SalesHistory.product_id == product_id,
+            forecast_models.SalesHistory.date >= datetime.combine(cutoff_date.date(), datetime.min.time())
+        ).all()
+        for day, quantity in archived:
+            sales_by_date[day.date()] = sales_by_date.get(day.date(), 0) + quantity
         
         # Create date range and fill missing dates with 0
         start_date = cutoff_date.date()
@@ -282,23 +296,39 @@ class DemandForecaster:
         """
         Save predictions to database
         """
-        # Delete old forecasts for this product
+        # Delete old forecasts for this product (from both storage formats)
         self.db.query(forecast_models.DemandForecast).filter(
             forecast_models.DemandForecast.product_id == product_id
         ).delete()
+        self.db.query(forecast_models.PackedForecast).filter(
+            forecast_models.PackedForecast.product_id == product_id
+        ).delete()
         
-        # Insert new forecasts
-        for _, row in predictions_df.iterrows():
-            forecast = forecast_models.DemandForecast(
+        if forecast_models.FORECAST_STORAGE == "packed":
+            # One row for the whole horizon
+            self.db.add(forecast_models.PackedForecast(
                 product_id=product_id,
-                forecast_date=row['date'],
-                predicted_demand=row['predicted_demand'],
-                confidence_lower=row['confidence_lower'],
-                confidence_upper=row['confidence_upper'],
+                start_date=pd.Timestamp(predictions_df['date'].iloc[0]).to_pydatetime(),
+                horizon=len(predictions_df),
+                predicted_demand=forecast_models.pack_floats(predictions_df['predicted_demand']),
+                confidence_lower=forecast_models.pack_floats(predictions_df['confidence_lower']),
+                confidence_upper=forecast_models.pack_floats(predictions_df['confidence_upper']),
                 model_used=self.best_model_name
-            )
-            self.db.add(forecast)
-        
+            ))
+        else:
+            # Insert new forecasts
+            for _, row in predictions_df.iterrows():
+                forecast = forecast_models.DemandForecast(
+                    product_id=product_id,
+                    forecast_date=row['date'],
+                    predicted_demand=row['predicted_demand'],
+                    confidence_lower=row['confidence_lower'],
+                    confidence_upper=row['confidence_upper'],
+                    model_used=self.best_model_name
+                )
+                self.db.add(forecast)
+        
+        versioning.bump(self.db, versioning.FORECASTS)
         self.db.commit()
     
     def generate_stock_alerts(self, product_id: int):
@@ -310,17 +340,15 @@ class DemandForecaster:
             return
         
         # Get predictions for next 30 days
-        forecasts = self.db.query(forecast_models.DemandForecast).filter(
-            forecast_models.DemandForecast.product_id == product_id
-        ).order_by(forecast_models.DemandForecast.forecast_date).limit(30).all()
+        forecasts = crud.load_forecasts(self.db, product_id).get(product_id, [])[:30]
         
         if not forecasts:
             return
         
         # Calculate total predicted demand
-        total_demand_7 = sum([f.predicted_demand for f in forecasts[:7]])
-        total_demand_14 = sum([f.predicted_demand for f in forecasts[:14]])
-        total_demand_30 = sum([f.predicted_demand for f in forecasts[:30]])
+        total_demand_7 = sum([f['predicted_demand'] for f in forecasts[:7]])
+        total_demand_14 = sum([f['predicted_demand'] for f in forecasts[:14]])
+        total_demand_30 = sum([f['predicted_demand'] for f in forecasts[:30]])
         
         current_stock = product.stock_quantity
         
@@ -361,15 +389,18 @@ class DemandForecaster:
                 days_until_stockout=int(days_until_stockout)
             )
             self.db.add(alert)
-            self.db.commit()
+
+        # Commit even without a new alert so the delete of stale ones lands
+        versioning.bump(self.db, versioning.ALERTS)
+        self.db.commit()
 
 
-def train_all_products(db: Session):
+def train_all_products(db: Session, read_db: Session = None):
     """
     Train forecasting models for all products
     """
-    forecaster = DemandForecaster(db)
-    products = db.query(models.Product).all()
+    forecaster = DemandForecaster(db, read_db=read_db)
+    products = forecaster.read_db.query(models.Product).all()
     
     results = []
     for product in products:
@@ -1,100 +1,300 @@
 """
 Generate demo sales data for demand forecasting
+
+Builds a synthetic order history with the shapes the forecaster has to cope
+with, fast enough to produce millions of orders:
+  * every product gets a demand profile: steady, seasonal (yearly peak
+    around the holidays), trending (growing or declining) or intermittent
+    (sells on a few days only)
+  * weekly seasonality for everyone, and random promotions (price cut +
+    demand uplift for a few days)
+  * seeded randomness, so the same arguments produce the same data
+
+Rows are written with chunked Core bulk inserts, one transaction per chunk.
+
+Usage:
+  python generate_demo_data.py                       # replace orders, 365 days
+  python generate_demo_data.py --orders-per-day 5000 --products 2000
+  python generate_demo_data.py --append              # fill days since the newest order
 """
-from datetime import datetime, timedelta
+import argparse
+import itertools
+import math
+import os
 import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
+import database
+import forecast_models
+import migrations
 import models
-from database import SessionLocal
+import versioning
+
+# Curated list of realistic names
+CUSTOMER_NAMES = [
+    "Haseeb Ahmed", "Sarah Khan", "Zeeshan Ali", "Ayesha Malik",
+    "Omar Farooq", "Fatima Zahra", "Bilal Sheikh", "Sana Javed",
+    "Hamza Siddiqui", "Anam Yousaf", "Usman Ghani", "Maria B",
+    "John Doe", "Jane Smith", "Alex Johnson", "Emily Brown"
+]
+
+CITIES = ["Karachi", "Lahore", "Islamabad", "Faisalabad", "Rawalpindi", "London", "New York"]
+
+CATEGORIES = ["Electronics", "Audio", "Wearables", "Home", "Gaming", "Accessories", "Cameras", "Computers"]
+
+PROFILES = ("steady", "seasonal", "trending", "intermittent")
+
+# Relative sales by weekday (Mon..Sun); weekends sell more
+WEEKDAY_FACTORS = (0.85, 0.8, 0.85, 0.9, 1.05, 1.3, 1.25)
+
+# Yearly peak (day of year) for seasonal products: late November
+SEASON_PEAK_DAY = 330
+
+
+class ProductProfile:
+    """Demand shape of one product"""
+
+    def __init__(self, product_id: int, price: float, kind: str, rng: random.Random,
+                 days: int, start: datetime, promos_per_year: float):
+        self.product_id = product_id
+        self.price = price
+        self.kind = kind
+        # Long-tailed popularity: a few best sellers, many slow movers
+        self.popularity = rng.paretovariate(1.5)
+        self.season_amplitude = rng.uniform(0.4, 0.9) if kind == "seasonal" else rng.uniform(0.0, 0.15)
+        self.trend_per_year = rng.uniform(-0.6, 1.5) if kind == "trending" else 0.0
+        self.active_probability = rng.uniform(0.05, 0.3) if kind == "intermittent" else 1.0
+
+        # Promotions: (first_day, last_day, demand uplift, price discount)
+        self.promotions = []
+        expected = promos_per_year * days / 365
+        for _ in range(int(expected) + (rng.random() < expected % 1)):
+            first = rng.randrange(days)
+            length = rng.randint(3, 10)
+            self.promotions.append((first, first + length - 1, rng.uniform(1.5, 3.0), rng.uniform(0.1, 0.3)))
+        self.start_doy = start.timetuple().tm_yday
+
+    def promotion(self, day: int):
+        for first, last, uplift, discount in self.promotions:
+            if first <= day <= last:
+                return uplift, discount
+        return None
+
+    def weight(self, day: int, rng: random.Random) -> float:
+        """Relative demand on `day` (0 = first generated day)"""
+        if self.active_probability < 1.0:
+            if rng.random() >= self.active_probability:
+                return 0.0
+            level = self.popularity / self.active_probability
+        else:
+            level = self.popularity
+
+        doy = (self.start_doy + day) % 365
+        season = 1 + self.season_amplitude * math.cos(2 * math.pi * (doy - SEASON_PEAK_DAY) / 365)
+        trend = max(0.05, 1 + self.trend_per_year * day / 365)
+        promo = self.promotion(day)
+        return level * season * trend * (promo[0] if promo else 1.0)
+
+    def price_on(self, day: int) -> float:
+        promo = self.promotion(day)
+        return round(self.price * (1 - promo[1]), 2) if promo else self.price
+
+
+def ensure_products(db: Session, count: int, rng: random.Random) -> list:
+    """Existing products, topped up with synthetic ones until there are `count`"""
+    existing = db.query(func.count(models.Product.id)).scalar()
+    missing = count - existing
+    if missing > 0:
+        print(f"Adding {missing} synthetic products...")
+        rows = []
+        for i in range(existing + 1, count + 1):
+            category = rng.choice(CATEGORIES)
+            rows.append({
+                "name": f"{category} Item {i}",
+                "description": f"Demo {category.lower()} product #{i}",
+                "price": round(rng.lognormvariate(4.5, 0.9), 2),
+                "stock_quantity": rng.randint(0, 500),
+                "category": category,
+            })
+        db.execute(models.Product.__table__.insert(), rows)
+        versioning.bump(db, versioning.PRODUCTS)
+        versioning.log_product_changes(db)
+        db.commit()
+    return db.execute(select(models.Product.id, models.Product.price).order_by(models.Product.id)).all()
 
-def generate_demo_sales_data(days: int = 60):
+
+def order_status(age_days: int, rng: random.Random) -> str:
+    if rng.random() < 0.03:
+        return "cancelled"
+    if age_days > 7:
+        return "delivered"
+    return rng.choice(["pending", "processing", "shipped", "delivered"] if age_days > 1 else ["pending", "processing"])
+
+
+def generate_demo_sales_data(days: int = 365, orders_per_day: int = 200, products: int = 0,
+                             customers: int = 5000, append: bool = False, seed: int = 42,
+                             chunk_size: int = 20_000, promos_per_year: float = 4.0,
+                             profile_mix=(0.4, 0.25, 0.2, 0.15), database_url: str = None):
     """
-    Generate realistic sales data for the last 'days' days
+    Write `days` days of orders ending today. With `append` existing orders
+    are kept and only the days after the newest one (at most `days`) are filled. `products` tops the catalog up to that
+    many products; `profile_mix` weights steady/seasonal/trending/intermittent.
     """
-    db = SessionLocal()
-    
-    # Curated list of realistic names
-    CUSTOMER_NAMES = [
-        "Haseeb Ahmed", "Sarah Khan", "Zeeshan Ali", "Ayesha Malik", 
-        "Omar Farooq", "Fatima Zahra", "Bilal Sheikh", "Sana Javed",
-        "Hamza Siddiqui", "Anam Yousaf", "Usman Ghani", "Maria B",
-        "John Doe", "Jane Smith", "Alex Johnson", "Emily Brown"
-    ]
-    
-    CITIES = ["Karachi", "Lahore", "Islamabad", "Faisalabad", "Rawalpindi", "London", "New York"]
+    rng = random.Random(seed)
+    engine = database.engine
+    if database_url:
+        engine, _ = database.build_engines(database_url, split=False)
+    migrations.init_db(bind=engine)
+    db = Session(bind=engine)
 
     try:
-        # Cleanup PREVIOUS demo data to fix slowness
-        print("Cleaning up old demo data...")
-        db.query(models.OrderItem).delete()
-        db.query(models.Order).delete()
-        db.commit()
-
-        products = db.query(models.Product).all()
-        
-        if not products:
-            print("No products found. Please run seed.py first.")
+        catalog = ensure_products(db, products, rng)
+        if not catalog:
+            print("No products found. Please run seed.py first (or pass --products N).")
             return
-        
-        print(f"Found {len(products)} products. Generating {days} days of sales data...")
-        
-        # Generate orders for each day
-        start_date = datetime.utcnow() - timedelta(days=days)
-        
-        for day_offset in range(days):
-            order_date = start_date + timedelta(days=day_offset)
-            
-            # Determine number of orders for this day (More orders on weekends)
-            is_weekend = order_date.weekday() >= 5
-            base_orders = random.randint(4, 10) if is_weekend else random.randint(2, 6)
-            
-            for _ in range(base_orders):
-                name = random.choice(CUSTOMER_NAMES)
-                email = f"{name.lower().replace(' ', '.')}@example.com"
-                city = random.choice(CITIES)
-                address = f"House {random.randint(1, 400)}, Sector {random.choice(['A', 'B', 'G', 'F'])}, {city}"
-
-                # Create order
-                order = models.Order(
-                    customer_name=name,
-                    customer_email=email,
-                    shipping_address=address,
-                    total_amount=0,
-                    status=random.choice(["pending", "delivered", "delivered", "delivered", "pending"]), # Bias towards delivered
-                    created_at=order_date
-                )
-                db.add(order)
-                db.flush()  # Get order ID
-                
-                # Select 1-4 random products for this order
-                num_items = random.randint(1, 4)
-                selected_products = random.sample(products, min(num_items, len(products)))
-
-                total = 0
-                for product in selected_products:
-                    quantity = random.randint(1, 2)
-                    price = product.price
-                    
-                    order_item = models.OrderItem(
-                        order_id=order.id,
-                        product_id=product.id,
-                        quantity=quantity,
-                        price_at_purchase=price
-                    )
-                    db.add(order_item)
+
+        today = datetime.utcnow()
+        start = (today - timedelta(days=days - 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        if append:
+            newest = db.query(func.max(models.Order.created_at)).scalar()
+            if newest is not None:
+                start = max(start, newest.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1))
+                days = (today - start).days + 1
+                if days <= 0:
+                    print("Orders are already up to date.")
+                    return
+        else:
+            # Archived orders and their rollups too, or they would be counted
+            # next to the regenerated history (sales_history is only fed by
+            # archive.py)
+            print("Removing existing orders...")
+            for model in (models.OrderItem, models.Order, models.ArchivedOrderItem, models.ArchivedOrder,
+                          models.OrderDailyRollup, forecast_models.SalesHistory):
+                db.query(model).delete(synchronize_session=False)
+            db.commit()
+
+        # Archived ids are never reused
+        order_id = max(db.query(func.max(models.Order.id)).scalar() or 0,
+                       db.query(func.max(models.ArchivedOrder.id)).scalar() or 0) + 1
+        item_id = max(db.query(func.max(models.OrderItem.id)).scalar() or 0,
+                      db.query(func.max(models.ArchivedOrderItem.id)).scalar() or 0) + 1
+
+        profiles = [
+            ProductProfile(pid, price, kind, rng, days, start, promos_per_year)
+            for (pid, price), kind in zip(catalog, rng.choices(PROFILES, profile_mix, k=len(catalog)))
+        ]
+        print(f"Generating {days} days x ~{orders_per_day} orders/day over {len(profiles)} products "
+              f"(seed {seed})...")
+
+        started = time.perf_counter()
+        order_rows, item_rows = [], []
+        total_orders = total_items = 0
+
+        def flush():
+            nonlocal order_rows, item_rows
+            if order_rows:
+                # Through the session: the app's writer pool has one connection
+                db.execute(models.Order.__table__.insert(), order_rows)
+                db.execute(models.OrderItem.__table__.insert(), item_rows)
+                db.commit()
+            order_rows, item_rows = [], []
+
+        for day in range(days):
+            day_start = start + timedelta(days=day)
+            weights = [p.weight(day, rng) for p in profiles]
+            cumulative = list(itertools.accumulate(weights))
+            if cumulative[-1] <= 0:
+                continue
+
+            expected = orders_per_day * WEEKDAY_FACTORS[day_start.weekday()]
+            n_orders = max(0, round(rng.gauss(expected, math.sqrt(expected))))
+            # Today only runs up to now, so no order is dated in the future
+            day_seconds = min(86_400, max(1, int((today - day_start).total_seconds())))
+            seconds = sorted(rng.randrange(day_seconds) for _ in range(n_orders))
+            age_days = (today - day_start).days
+
+            for second in seconds:
+                # 1-4 weighted product picks; repeats become quantity
+                picks = {}
+                for index in rng.choices(range(len(profiles)), cum_weights=cumulative, k=rng.randint(1, 4)):
+                    picks[index] = picks.get(index, 0) + rng.randint(1, 2)
+
+                total = 0.0
+                for index, quantity in picks.items():
+                    profile = profiles[index]
+                    price = profile.price_on(day)
+                    item_rows.append({"id": item_id, "order_id": order_id, "product_id": profile.product_id,
+                                      "quantity": quantity, "price_at_purchase": price})
+                    item_id += 1
                     total += price * quantity
-                
-                order.total_amount = total
-        
-        db.commit()
-        print(f"Generated demo sales data for {days} days!")
-        
+
+                customer = rng.randrange(customers)
+                name = CUSTOMER_NAMES[customer % len(CUSTOMER_NAMES)]
+                order_rows.append({
+                    "id": order_id,
+                    "customer_name": name,
+                    "customer_email": f"{name.lower().replace(' ', '.')}{customer}@example.com",
+                    "shipping_address": f"House {rng.randint(1, 400)}, Sector {rng.choice('ABGF')}, "
+                                        f"{rng.choice(CITIES)}",
+                    "total_amount": round(total, 2),
+                    "status": order_status(age_days, rng),
+                    "created_at": day_start + timedelta(seconds=second),
+                })
+                order_id += 1
+
+            total_orders += len(seconds)
+            if len(order_rows) >= chunk_size:
+                total_items += len(item_rows)
+                flush()
+                print(f"  {day + 1}/{days} days, {total_orders} orders...")
+
+        total_items += len(item_rows)
+        flush()
+        elapsed = time.perf_counter() - started
+        print(f"Generated {total_orders} orders / {total_items} items in {elapsed:.1f}s "
+              f"({total_orders / max(elapsed, 1e-9):.0f} orders/s)")
+
     except Exception as e:
         print(f"Error generating demo data: {e}")
         db.rollback()
+        raise
     finally:
         db.close()
 
 
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--orders-per-day", type=int, default=200)
+    parser.add_argument("--products", type=int, default=0,
+                        help="Top the catalog up to this many products with synthetic ones")
+    parser.add_argument("--customers", type=int, default=5000)
+    parser.add_argument("--append", action="store_true",
+                        help="Keep existing orders and only fill the days after the newest one")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=20_000, help="Orders per insert transaction")
+    parser.add_argument("--promos-per-year", type=float, default=4.0)
+    parser.add_argument("--profile-mix", default="0.4,0.25,0.2,0.15",
+                        help="Weights for steady,seasonal,trending,intermittent products")
+    parser.add_argument("--database-url", default=None, help="Defaults to DATABASE_URL / the app database")
+    args = parser.parse_args()
+
+    mix = tuple(float(w) for w in args.profile_mix.split(","))
+    if len(mix) != len(PROFILES):
+        parser.error(f"--profile-mix needs {len(PROFILES)} weights")
+
+    generate_demo_sales_data(
+        days=args.days, orders_per_day=args.orders_per_day, products=args.products,
+        customers=args.customers, append=args.append, seed=args.seed, chunk_size=args.chunk_size,
+        promos_per_year=args.promos_per_year, profile_mix=mix, database_url=args.database_url,
+    )
+
+
 if __name__ == "__main__":
-    generate_demo_sales_data(days=60)
+    main()
@@ -0,0 +1,218 @@
+"""
+LLM providers for the chatbot
+
+The chatbot talks to a provider through three calls (generate, generate_async
+and stream_async), all returning plain text. Each provider builds its client
+once and reuses it for every request.
+
+  * gemini: Google Gemini through google.generativeai (the default)
+  * stub:   local, deterministic replies; no network, no API key. Used by the
+            load test and for measuring the chat pipeline's own overhead.
+
+Select with LLM_PROVIDER. LLM_INJECT_LATENCY_MS / LLM_INJECT_FAILURE_RATE add
+latency and random failures in front of any provider, to exercise retries
+and the circuit breaker.
+"""
+import asyncio
+from abc import ABC, abstractmethod
+import os
+import random
+import re
+import threading
+import time
+from typing import AsyncIterator
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+
+LLM_INJECT_LATENCY_MS = float(os.getenv("LLM_INJECT_LATENCY_MS", "0"))
+LLM_INJECT_FAILURE_RATE = float(os.getenv("LLM_INJECT_FAILURE_RATE", "0"))
+LLM_INJECT_SEED = os.getenv("LLM_INJECT_SEED")
+
+# Stub pacing: time to first token, then per streamed word
+LLM_STUB_LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", "0"))
+LLM_STUB_TOKEN_MS = float(os.getenv("LLM_STUB_TOKEN_MS", "0"))
+
+
+class LLMProviderError(Exception):
+    """The provider could not produce a reply (network, quota, injected fault)"""
+
+
+class LLMProvider(ABC):
+    name = "base"
+
+    @property
+    def available(self) -> bool:
+        """False if the provider is not configured (e.g. no API key)"""
+        return True
+
+    def warm_up(self):
+        """Do slow one-time setup now (called from a worker thread, not the event loop)"""
+
+    @abstractmethod
+    def generate(self, prompt: str) -> str:
+        """Whole reply, blocking"""
+
+    @abstractmethod
+    async def generate_async(self, prompt: str) -> str:
+        """Whole reply, without blocking the event loop"""
+
+    async def stream_async(self, prompt: str) -> AsyncIterator[str]:
+        """Reply text in chunks as they are produced"""
+        yield await self.generate_async(prompt)
+
+
+def _text(response) -> str:
+    # .text raises if the candidate was blocked; that is an empty reply, not an error
+    try:
+        return response.text or ""
+    except ValueError:
+        return ""
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, api_key: str, model_name: str, generation_config: dict = None, safety_settings: list = None):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.generation_config = generation_config
+        self.safety_settings = safety_settings
+        self._lock = threading.Lock()
+        self._model = None
+
+    @property
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    @property
+    def model(self):
+        # The SDK is imported on first use, it is slow to load
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel(
+                        model_name=self.model_name,
+                        generation_config=self.generation_config,
+                        safety_settings=self.safety_settings,
+                    )
+        return self._model
+
+    def warm_up(self):
+        self.model
+
+    def generate(self, prompt: str) -> str:
+        return _text(self.model.generate_content(prompt))
+
+    async def generate_async(self, prompt: str) -> str:
+        return _text(await self.model.generate_content_async(prompt))
+
+    async def stream_async(self, prompt: str) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            text = _text(chunk)
+            if text:
+                yield text
+
+
+class StubProvider(LLMProvider):
+    """
+    Answers from the prompt itself: names the first listed product and
+    reports the prompt size. The same prompt always gets the same reply.
+    """
+    name = "stub"
+    _PRODUCT = re.compile(r"^• (.+?) - \$[\d.]+ \| Category:", re.MULTILINE)
+
+    def __init__(self, latency_ms: float = 0.0, token_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.token_delay = token_ms / 1000
+
+    def reply(self, prompt: str) -> str:
+        match = self._PRODUCT.search(prompt)
+        product = f" You might like {match.group(1)}." if match else ""
+        return f"(stub reply) Thanks for asking!{product} [prompt: {len(prompt)} chars]"
+
+    def generate(self, prompt: str) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        return self.reply(prompt)
+
+    async def generate_async(self, prompt: str) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.reply(prompt)
+
+    async def stream_async(self, prompt: str) -> AsyncIterator[str]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        words = self.reply(prompt).split(" ")
+        for i, word in enumerate(words):
+            if i and self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield word if i == 0 else " " + word
+
+
+class FaultInjector(LLMProvider):
+    """Adds fixed latency and random failures in front of another provider"""
+
+    def __init__(self, provider: LLMProvider, latency_ms: float = 0.0, failure_rate: float = 0.0, seed=None):
+        self.provider = provider
+        self.name = provider.name
+        self.latency = latency_ms / 1000
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.injected_failures = 0
+
+    @property
+    def available(self) -> bool:
+        return self.provider.available
+
+    def warm_up(self):
+        self.provider.warm_up()
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            fail = self._random.random() < self.failure_rate
+            if fail:
+                self.injected_failures += 1
+            return fail
+
+    def generate(self, prompt: str) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        if self._should_fail():
+            raise LLMProviderError("Injected failure")
+        return self.provider.generate(prompt)
+
+    async def generate_async(self, prompt: str) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self._should_fail():
+            raise LLMProviderError("Injected failure")
+        return await self.provider.generate_async(prompt)
+
+    async def stream_async(self, prompt: str) -> AsyncIterator[str]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self._should_fail():
+            raise LLMProviderError("Injected failure")
+        async for text in self.provider.stream_async(prompt):
+            yield text
+
+
+def create_provider(name: str = LLM_PROVIDER, **gemini_options) -> LLMProvider:
+    """Provider named `name`, wrapped in a FaultInjector if injection is configured"""
+    if name == "gemini":
+        provider = GeminiProvider(os.getenv("GEMINI_API_KEY"), GEMINI_MODEL, **gemini_options)
+    elif name == "stub":
+        provider = StubProvider(LLM_STUB_LATENCY_MS, LLM_STUB_TOKEN_MS)
+    else:
+        raise ValueError(f"Unknown LLM_PROVIDER: {name} (use gemini or stub)")
+
+    if LLM_INJECT_LATENCY_MS or LLM_INJECT_FAILURE_RATE:
+        seed = int(LLM_INJECT_SEED) if LLM_INJECT_SEED is not None else None
+        provider = FaultInjector(provider, LLM_INJECT_LATENCY_MS, LLM_INJECT_FAILURE_RATE, seed)
+    return provider
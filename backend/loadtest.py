@@ -0,0 +1,252 @@
+"""
+Load harness for the API.
+
+Seeds a synthetic store on a scratch database, starts a local uvicorn against
+it and drives a weighted mix of traffic at a fixed concurrency:
+  * browse:   GET /products/ (first page or a follow-up cursor page) and
+              GET /products/{id}
+  * checkout: POST /orders/ with 1-3 random items
+  * admin:    GET /admin/stats
+  * chat:     POST /chat/message with a product or order question
+
+Gemini is never called: the server runs with LLM_PROVIDER=stub, which
+answers after --llm-latency-ms (and fails --llm-failure-rate of calls), so
+chat numbers measure our prompt building and DB work, not the network.
+
+Prints (and optionally writes) per-route throughput and p50/p95/p99 latency
+as JSON, so runs can be diffed for regressions.
+
+Usage: python loadtest.py [--seconds 30] [--concurrency 16]
+                          [--mix browse=70,checkout=15,admin=5,chat=10]
+                          [--output results.json]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BACKEND_DIR)
+
+from benchmark_async import free_port, wait_until_up
+from benchmark_db import seed
+
+CHAT_MESSAGES = [
+    "What laptops do you have under $500?",
+    "kis range me products hain?",
+    "delivery policy kya hai?",
+    "What is the status of ORD-{order}?",
+    "Do you have anything in {category}?",
+]
+
+
+def percentile(ordered: list, pct: float) -> float:
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - set(SCENARIOS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+    return mix
+
+
+class Client:
+    """One keep-alive connection; records latency per route template"""
+
+    def __init__(self, port: int, products: int, orders: int, rng: random.Random):
+        self.port = port
+        self.products = products
+        self.orders = orders
+        self.rng = rng
+        self.cursor = None
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        self.samples = {}   # route -> list of seconds
+        self.errors = {}    # route -> count
+
+    def request(self, route: str, method: str, path: str, body: dict = None):
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        payload = json.dumps(body) if body is not None else None
+        started = time.perf_counter()
+        try:
+            self.conn.request(method, path, body=payload, headers=headers)
+            response = self.conn.getresponse()
+            response.read()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=120)
+            response, ok = None, False
+
+        if ok:
+            self.samples.setdefault(route, []).append(time.perf_counter() - started)
+        else:
+            self.errors[route] = self.errors.get(route, 0) + 1
+        return response
+
+    def browse(self):
+        if self.rng.random() < 0.5:
+            path = f"/products/?limit=20&cursor={self.cursor}" if self.cursor else "/products/?limit=20"
+            response = self.request("GET /products/", "GET", path)
+            self.cursor = response.getheader("X-Next-Cursor") if response is not None else None
+        else:
+            product_id = self.rng.randint(1, self.products)
+            self.request("GET /products/{product_id}", "GET", f"/products/{product_id}")
+
+    def checkout(self):
+        items = [
+            {"product_id": self.rng.randint(1, self.products), "quantity": self.rng.randint(1, 3)}
+            for _ in range(self.rng.randint(1, 3))
+        ]
+        self.request("POST /orders/", "POST", "/orders/", {
+            "customer_name": "Load Test",
+            "customer_email": f"load{self.rng.randint(1, 500)}@example.com",
+            "shipping_address": "1 Benchmark Road",
+            "total_amount": 0,
+            "items": items,
+        })
+
+    def admin(self):
+        self.request("GET /admin/stats", "GET", "/admin/stats")
+
+    def chat(self):
+        message = self.rng.choice(CHAT_MESSAGES).format(
+            order=str(self.rng.randint(1, self.orders)).zfill(4),
+            category=f"Cat {self.rng.randint(0, 11)}",
+        )
+        self.request("POST /chat/message", "POST", "/chat/message", {"message": message})
+
+
+SCENARIOS = {
+    "browse": Client.browse,
+    "checkout": Client.checkout,
+    "admin": Client.admin,
+    "chat": Client.chat,
+}
+
+
+def drive(port: int, seconds: float, concurrency: int, mix: dict, products: int, orders: int) -> dict:
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    clients = [Client(port, products, orders, random.Random(i)) for i in range(concurrency)]
+    stop = time.monotonic() + seconds
+
+    def worker(client: Client):
+        while time.monotonic() < stop:
+            scenario = client.rng.choices(names, weights)[0]
+            SCENARIOS[scenario](client)
+        client.conn.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(c,)) for c in clients]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    samples, errors = {}, {}
+    for client in clients:
+        for route, values in client.samples.items():
+            samples.setdefault(route, []).extend(values)
+        for route, count in client.errors.items():
+            errors[route] = errors.get(route, 0) + count
+
+    routes = {}
+    for route in sorted(set(samples) | set(errors)):
+        ordered = sorted(samples.get(route, []))
+        routes[route] = {
+            "requests": len(ordered),
+            "errors": errors.get(route, 0),
+            "throughput_rps": round(len(ordered) / elapsed, 2),
+            "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+        }
+
+    everything = sorted(v for values in samples.values() for v in values)
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "total": {
+            "requests": len(everything),
+            "errors": sum(errors.values()),
+            "throughput_rps": round(len(everything) / elapsed, 2),
+            "p50_ms": round(percentile(everything, 50) * 1000, 2),
+            "p95_ms": round(percentile(everything, 95) * 1000, 2),
+            "p99_ms": round(percentile(everything, 99) * 1000, 2),
+        },
+        "routes": routes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mix", type=parse_mix, default="browse=70,checkout=15,admin=5,chat=10",
+                        help="Scenario weights, e.g. browse=70,checkout=15,admin=5,chat=10")
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=20_000)
+    parser.add_argument("--llm-latency-ms", type=float, default=300,
+                        help="Simulated Gemini response time")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0,
+                        help="Fraction of LLM calls that fail (exercises retries and the circuit breaker)")
+    parser.add_argument("--warmup", type=float, default=2, help="Seconds of untimed traffic first")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'loadtest.db')}"
+        print(f">> Seeding ({args.products} products, {args.orders} orders)...", file=sys.stderr)
+        seed(url, args.products, args.orders)
+
+        port = free_port()
+        env = dict(os.environ, DATABASE_URL=url, LLM_PROVIDER="stub",
+                   LLM_STUB_LATENCY_MS=str(args.llm_latency_ms),
+                   LLM_INJECT_FAILURE_RATE=str(args.llm_failure_rate))
+        server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                                   "--port", str(port), "--log-level", "warning"], cwd=BACKEND_DIR, env=env)
+        try:
+            wait_until_up(port)
+            if args.warmup:
+                drive(port, args.warmup, args.concurrency, args.mix, args.products, args.orders)
+            print(f">> {args.concurrency} clients for {args.seconds}s, mix {args.mix}...", file=sys.stderr)
+            results = drive(port, args.seconds, args.concurrency, args.mix, args.products, args.orders)
+        finally:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "config": {
+            "seconds": args.seconds,
+            "concurrency": args.concurrency,
+            "mix": args.mix,
+            "products": args.products,
+            "orders": args.orders,
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_failure_rate": args.llm_failure_rate,
+        },
+        **results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
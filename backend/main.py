@@ -1,25 +1,45 @@
 import sys
 import os
+import json
 
 # Fix for Windows uvicorn reloader finding logic
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from fastapi import FastAPI, Depends, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+from datetime import datetime
 import crud, models, schemas
-from database import SessionLocal, engine
+from database import engine, read_engine, async_read_engine, get_db, get_read_db, DB_ASYNC_READS
 from pydantic import BaseModel
-import forecasting
 import forecast_models
-import chatbot
-
-# Create the database tables
-models.Base.metadata.create_all(bind=engine)
-forecast_models.Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="E-commerce AI Backend")
+import search
+import archive
+import exports
+import feeds
+import versioning
+import metrics
+from catalog_cache import catalog
+
+# The forecasting (pandas/scikit-learn) and chatbot (google.generativeai)
+# stacks are imported inside the endpoints that use them, so workers that
+# only serve catalog traffic never pay for them.
+
+DB_INIT_ON_STARTUP = os.getenv("DB_INIT_ON_STARTUP", "1") == "1"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create/migrate the schema once per process start instead of at import
+    if DB_INIT_ON_STARTUP:
+        import migrations
+        migrations.init_db()
+    yield
+
+app = FastAPI(title="E-commerce AI Backend", lifespan=lifespan)
 
 # CORS setup
 origins = [
@@ -35,31 +55,87 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified"],
 )
 
-# Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Request timing and per-request SQL counts
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument_engine(engine)
+if read_engine is not engine:
+    metrics.instrument_engine(read_engine)
+if async_read_engine is not None:
+    metrics.instrument_engine(async_read_engine.sync_engine)
+
+# Async read endpoints are registered first so they shadow the sync versions
+# of the same routes below (which remain the fallback without aiosqlite).
+if DB_ASYNC_READS:
+    import async_reads
+    app.include_router(async_reads.router)
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the E-commerce AI Backend"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/slow-queries")
+def read_slow_queries():
+    """Most recent statements above SLOW_QUERY_MS, newest first"""
+    return metrics.registry.slow_query_log()
+
 @app.post("/products/", response_model=schemas.Product)
 def create_product(product: schemas.ProductCreate, db: Session = Depends(get_db)):
     return crud.create_product(db=db, product=product)
 
+@app.post("/products/bulk", response_model=schemas.BulkProductResult)
+async def bulk_upsert_products(request: Request, format: Optional[str] = None, db: Session = Depends(get_db)):
+    """
+    Create or update products from a CSV / NDJSON supplier feed, matched on
+    `sku`. Returns an outcome for every row; bad rows don't block the rest.
+    """
+    try:
+        fmt = feeds.detect_format(request.headers.get("content-type"), format)
+        body = await request.body()
+        records = list(feeds.parse_feed(body, fmt))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await run_in_threadpool(crud.bulk_upsert_products, db, records)
+
 @app.get("/products/", response_model=List[schemas.Product])
-def read_products(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    products = crud.get_products(db, skip=skip, limit=limit)
+def read_products(request: Request, response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                  category: Optional[str] = None, db: Session = Depends(get_read_db)):
+    stamps = versioning.current(db, versioning.PRODUCTS)
+    not_modified = versioning.conditional_get(request, response, stamps)
+    if not_modified:
+        return not_modified
+
+    # Pass the X-Next-Cursor header value back as `cursor` to fetch the next page
+    try:
+        products, next_cursor = crud.get_products_page(
+            db, cursor=cursor, limit=limit, skip=skip, category=category
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return products
 
+@app.get("/products/search", response_model=schemas.ProductSearchResult)
+def search_products(q: Optional[str] = None, category: Optional[str] = None,
+                    min_price: Optional[float] = None, max_price: Optional[float] = None,
+                    in_stock: Optional[bool] = None, limit: int = 20, offset: int = 0,
+                    db: Session = Depends(get_read_db)):
+    """Ranked full-text product search with category/price/stock facets"""
+    return search.search_products(
+        db, q=q, category=category, min_price=min_price, max_price=max_price,
+        in_stock=in_stock, limit=limit, offset=offset
+    )
+
 @app.get("/products/{product_id}", response_model=schemas.Product)
-def read_product(product_id: int, db: Session = Depends(get_db)):
+def read_product(product_id: int, db: Session = Depends(get_read_db)):
     db_product = crud.get_product(db, product_id=product_id)
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -81,7 +157,7 @@ class OrderStats(BaseModel):
     recent_orders: List[schemas.Order]
 
 @app.post("/admin/login")
-def admin_login(login: LoginRequest, db: Session = Depends(get_db)):
+def admin_login(login: LoginRequest, db: Session = Depends(get_read_db)):
     user = crud.get_user_by_email(db, email=login.email)
     if not user:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
@@ -104,28 +180,64 @@ def create_order(order: schemas.OrderCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/orders/", response_model=List[schemas.Order])
-def read_orders(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_orders(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                status: Optional[str] = None, customer_email: Optional[str] = None,
+                created_from: Optional[datetime] = None, created_to: Optional[datetime] = None,
+                db: Session = Depends(get_read_db)):
     # In a real app, verify admin token here
-    orders = db.query(models.Order).order_by(models.Order.id.desc()).offset(skip).limit(limit).all()
+    try:
+        orders, next_cursor = crud.get_orders_page(
+            db, cursor=cursor, limit=limit, skip=skip, status=status, customer_email=customer_email,
+            created_from=created_from, created_to=created_to
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return orders
+
+@app.get("/admin/orders/search", response_model=List[schemas.Order])
+def search_orders(response: Response, email: Optional[str] = None, email_prefix: Optional[str] = None,
+                  status: Optional[str] = None, created_from: Optional[datetime] = None,
+                  created_to: Optional[datetime] = None, cursor: Optional[str] = None, limit: int = 50,
+                  db: Session = Depends(get_read_db)):
+    """
+    A customer's orders by email (or email prefix), newest first, optionally by
+    status and date. An exact email walks the index in order; a prefix (at
+    least crud.EMAIL_PREFIX_MIN_LENGTH characters) sorts all its matches first.
+    """
+    if not (email and email.strip()) and not (email_prefix and email_prefix.strip()):
+        raise HTTPException(status_code=400, detail="Give an email or email_prefix")
+    try:
+        orders, next_cursor = crud.get_orders_page(
+            db, cursor=cursor, limit=min(max(limit, 1), 200), status=status, customer_email=email,
+            email_prefix=email_prefix, created_from=created_from, created_to=created_to
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return orders
 
 @app.get("/admin/stats", response_model=OrderStats)
-def get_admin_stats(db: Session = Depends(get_db)):
+def get_admin_stats(db: Session = Depends(get_read_db)):
     from sqlalchemy import func
     from datetime import datetime
     
-    # 1. Basic counts
-    total_orders = db.query(func.count(models.Order.id)).scalar()
+    # 1. Basic counts (archived orders are counted through their daily rollups)
+    archived_orders, archived_sales = archive.rollup_totals(db)
+    total_orders = db.query(func.count(models.Order.id)).scalar() + archived_orders
     total_products = db.query(func.count(models.Product.id)).scalar()
     
     # 2. Total Sales
-    total_sales = db.query(func.sum(models.Order.total_amount)).scalar() or 0
+    total_sales = (db.query(func.sum(models.Order.total_amount)).scalar() or 0) + archived_sales
     
     # 3. Monthly Sales
     now = datetime.utcnow()
     month_start = datetime(now.year, now.month, 1)
     monthly_sales = db.query(func.sum(models.Order.total_amount))\
         .filter(models.Order.created_at >= month_start).scalar() or 0
+    monthly_sales += archive.rollup_totals(db, since=month_start)[1]
     
     # 4. Recent Orders (Latest 10)
     recent_orders = db.query(models.Order).order_by(models.Order.id.desc()).limit(10).all()
@@ -138,6 +250,20 @@ def get_admin_stats(db: Session = Depends(get_db)):
         "recent_orders": recent_orders
     }
 
+@app.put("/orders/status", response_model=schemas.OrderBulkStatusResult)
+def bulk_update_order_status(update: schemas.OrderBulkStatusUpdate, db: Session = Depends(get_db)):
+    """Move a list of orders, or all orders matching a filter, to a new status"""
+    if (update.ids is None) == (update.filter is None):
+        raise HTTPException(status_code=400, detail="Pass exactly one of ids or filter")
+    criteria = update.filter or schemas.OrderStatusFilter()
+    try:
+        return crud.bulk_update_order_status(
+            db, update.status, ids=update.ids, status_from=criteria.status,
+            created_from=criteria.created_from, created_to=criteria.created_to
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.put("/orders/{order_id}/status", response_model=schemas.Order)
 def update_order_status(order_id: int, status_update: schemas.OrderStatusUpdate, db: Session = Depends(get_db)):
     db_order = crud.update_order_status(db, order_id, status_update.status)
@@ -154,53 +280,134 @@ def delete_order(order_id: int, db: Session = Depends(get_db)):
 
 @app.put("/products/{product_id}", response_model=schemas.Product)
 def update_product(product_id: int, product_update: schemas.ProductCreate, db: Session = Depends(get_db)):
-    db_product = db.query(models.Product).filter(models.Product.id == product_id).first()
+    db_product = crud.update_product(db, product_id=product_id, product=product_update)
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
-    
-    # Basic cleanup: remove trailing/leading spaces from name
-    if product_update.name:
-        product_update.name = product_update.name.strip()
-        
-    for key, value in product_update.dict().items():
-        setattr(db_product, key, value)
-    
-    db.commit()
-    db.refresh(db_product)
     return db_product
 
 @app.delete("/products/{product_id}")
 def delete_product(product_id: int, db: Session = Depends(get_db)):
-    db_product = db.query(models.Product).filter(models.Product.id == product_id).first()
-    if not db_product:
+    success = crud.delete_product(db, product_id=product_id)
+    if not success:
         raise HTTPException(status_code=404, detail="Product not found")
-    
-    db.delete(db_product)
-    db.commit()
     return {"message": "Product deleted successfully"}
 
+@app.post("/admin/archive")
+def archive_old_orders(retention_days: int = archive.ARCHIVE_RETENTION_DAYS, db: Session = Depends(get_db)):
+    """Fold orders older than the retention window into rollups and move them to the archive tables"""
+    try:
+        return archive.archive_orders(db, retention_days=retention_days)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/admin/cache/stats")
+def get_cache_stats():
+    """Hit/miss counters of the in-process catalog cache"""
+    return catalog.stats()
+
+# --- Export Endpoints ---
+
+def _export_response(name: str, format: str, chunks):
+    if format not in exports.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format} (use csv or ndjson)")
+    filename = f"{name}-{datetime.utcnow():%Y%m%d-%H%M%S}.{format}"
+    return StreamingResponse(chunks, media_type=exports.FORMATS[format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.get("/export/orders")
+def export_orders(format: str = "csv", status: Optional[str] = None,
+                  created_from: Optional[datetime] = None, created_to: Optional[datetime] = None,
+                  include_archived: bool = True):
+    """Stream all matching orders with their items, oldest first (archived ones too, unless turned off)"""
+    # In a real app, verify admin token here
+    return _export_response("orders", format, exports.export_orders(
+        format, status=status, created_from=created_from, created_to=created_to,
+        include_archived=include_archived
+    ))
+
+@app.get("/export/products")
+def export_products(format: str = "csv", category: Optional[str] = None):
+    """Stream the product catalog"""
+    return _export_response("products", format, exports.export_products(format, category=category))
+
+@app.get("/export/forecasts")
+def export_forecasts(format: str = "csv", product_id: Optional[int] = None):
+    """Stream stored demand forecasts"""
+    return _export_response("forecasts", format, exports.export_forecasts(format, product_id=product_id))
+
 # --- AI Chatbot Endpoint ---
 
 class ChatRequest(BaseModel):
     message: str
+    # Returned by the previous reply; omit to start a new conversation
+    session_id: Optional[str] = None
 
 @app.post("/chat/message")
-def chat_message(chat: ChatRequest, db: Session = Depends(get_db)):
-    # 1. Get response from Gemini (with RAG context)
-    ai_reply = chatbot.get_chat_response(db, chat.message)
-    return {"reply": ai_reply}
+async def chat_message(chat: ChatRequest, db: Session = Depends(get_read_db)):
+    # 1. Get response from Gemini (with RAG context), without holding a worker thread
+    import chatbot
+    session_id = chatbot.conversations.session_id(chat.session_id)
+    ai_reply = await chatbot.get_chat_response_async(db, chat.message, session_id)
+    return {"reply": ai_reply, "session_id": session_id}
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def _chat_events(chunks, session_id: str):
+    yield _sse("session", {"session_id": session_id})
+    try:
+        async for text in chunks:
+            yield _sse("token", {"text": text})
+    except Exception as e:
+        print(f"Chat stream error: {e!r}")
+        yield _sse("error", {"message": "The reply was interrupted. Please try again."})
+    finally:
+        # Frees the LLM slot right away if the client went away mid-reply
+        await chunks.aclose()
+    yield _sse("done", {})
+
+@app.post("/chat/stream")
+async def chat_stream(chat: ChatRequest, db: Session = Depends(get_read_db)):
+    """
+    Same reply as /chat/message, sent as Server-Sent Events while Gemini
+    generates it: `session` ({"session_id": ...}), `token` events
+    ({"text": ...}), then `done` (or `error` if the reply broke off midway).
+    """
+    import chatbot
+    session_id = chatbot.conversations.session_id(chat.session_id)
+    trace = chatbot.ChatTrace()
+    # All database work happens here; the session is closed before streaming starts
+    prepared = await run_in_threadpool(chatbot.prepare_chat_and_release, db, chat.message,
+                                       chatbot.history_for(session_id), trace)
+    chunks = chatbot.stream_chat(prepared, chat.message, session_id, trace)
+    return StreamingResponse(_chat_events(chunks, session_id), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/chat/telemetry")
+def get_chat_telemetry():
+    """Prompt size by section, prepare/DB/LLM latency and attempts over recent chat messages"""
+    import chatbot
+    return chatbot.telemetry.summary()
+
+@app.get("/chat/stats")
+def get_chat_stats():
+    """How many chat messages were answered locally or from the reply cache instead of by Gemini"""
+    import chatbot
+    stats = chatbot.router.stats()
+    stats["cache"] = chatbot.response_cache.stats()
+    stats["llm"] = {**chatbot.llm_limiter.stats(), "breaker": chatbot.llm_breaker.stats()}
+    stats["conversations"] = chatbot.conversations.stats()
+    return stats
 
 
 # --- Demand Forecasting Endpoints ---
 
 @app.post("/forecasting/train")
-def train_forecasting_models(db: Session = Depends(get_db)):
+def train_forecasting_models(db: Session = Depends(get_db), read_db: Session = Depends(get_read_db)):
     """Train ML models for all products"""
+    import forecasting
     try:
-        # Create tables if they don't exist
-        # forecast_models.Base.metadata.create_all(bind=engine) # Already done at startup
-        
-        results = forecasting.train_all_products(db)
+        results = forecasting.train_all_products(db, read_db=read_db)
         return {
             "message": "Forecasting models trained successfully",
             "products_trained": len(results),
@@ -211,85 +418,34 @@ def train_forecasting_models(db: Session = Depends(get_db)):
 
 
 @app.get("/forecasting/predictions")
-def get_all_predictions(db: Session = Depends(get_db)):
+def get_all_predictions(request: Request, response: Response, db: Session = Depends(get_read_db)):
     """Get predictions for all products, returning empty predictions for those without history"""
-    # 1. Get ALL products first
-    products = db.query(models.Product).all()
-    
-    # 2. Get ALL forecasts
-    forecasts = db.query(forecast_models.DemandForecast).all()
-    
-    # 3. Optimize lookup
-    forecast_map = {}
-    for f in forecasts:
-        if f.product_id not in forecast_map:
-            forecast_map[f.product_id] = []
-        
-        forecast_map[f.product_id].append({
-            "date": f.forecast_date.isoformat(),
-            "predicted_demand": f.predicted_demand,
-            "confidence_lower": f.confidence_lower,
-            "confidence_upper": f.confidence_upper,
-            "model_used": f.model_used
-        })
-    
-    # 4. Construct response including ALL products
-    results = []
-    for product in products:
-        results.append({
-            "product_id": product.id,
-            "product_name": product.name,
-            "current_stock": product.stock_quantity,
-            "predictions": forecast_map.get(product.id, [])  # Empty list if no forecasts
-        })
-    
-    return results
+    stamps = versioning.current(db, versioning.PRODUCTS, versioning.FORECASTS)
+    not_modified = versioning.conditional_get(request, response, stamps)
+    if not_modified:
+        return not_modified
+
+    return crud.get_all_predictions(db)
 
 
 @app.get("/forecasting/predictions/{product_id}")
-def get_product_predictions(product_id: int, db: Session = Depends(get_db)):
+def get_product_predictions(product_id: int, db: Session = Depends(get_read_db)):
     """Get predictions for a specific product"""
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
-    if not product:
+    result = crud.get_product_predictions(db, product_id)
+    if result is None:
         raise HTTPException(status_code=404, detail="Product not found")
-    
-    forecasts = db.query(forecast_models.DemandForecast).filter(
-        forecast_models.DemandForecast.product_id == product_id
-    ).order_by(forecast_models.DemandForecast.forecast_date).all()
-    
-    predictions = [{
-        "date": f.forecast_date.isoformat(),
-        "predicted_demand": f.predicted_demand,
-        "confidence_lower": f.confidence_lower,
-        "confidence_upper": f.confidence_upper,
-        "model_used": f.model_used
-    } for f in forecasts]
-    
-    return {
-        "product_id": product_id,
-        "product_name": product.name,
-        "current_stock": product.stock_quantity,
-        "predictions": predictions
-    }
+    return result
 
 
 @app.get("/forecasting/alerts")
-def get_stock_alerts(db: Session = Depends(get_db)):
+def get_stock_alerts(request: Request, response: Response, db: Session = Depends(get_read_db)):
     """Get all active stock alerts"""
-    alerts = db.query(forecast_models.StockAlert).filter(
-        forecast_models.StockAlert.status == "active"
-    ).order_by(forecast_models.StockAlert.alert_type).all()
-    
-    return [{
-        "id": a.id,
-        "product_id": a.product_id,
-        "product_name": a.product.name if a.product else "Unknown",
-        "alert_type": a.alert_type,
-        "message": a.message,
-        "recommended_order_qty": a.recommended_order_qty,
-        "days_until_stockout": a.days_until_stockout,
-        "created_at": a.created_at.isoformat()
-    } for a in alerts]
+    stamps = versioning.current(db, versioning.PRODUCTS, versioning.ALERTS)
+    not_modified = versioning.conditional_get(request, response, stamps)
+    if not_modified:
+        return not_modified
+
+    return crud.get_active_alerts(db)
 
 
 @app.put("/forecasting/alerts/{alert_id}/dismiss")
@@ -303,18 +459,20 @@ def dismiss_alert(alert_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Alert not found")
     
     alert.status = "dismissed"
+    versioning.bump(db, versioning.ALERTS)
     db.commit()
     
     return {"message": "Alert dismissed successfully"}
 
 
 @app.get("/forecasting/trends/{product_id}")
-def get_product_trends(product_id: int, days: int = 60, db: Session = Depends(get_db)):
+def get_product_trends(product_id: int, days: int = 60, db: Session = Depends(get_read_db)):
     """Get historical sales trends for a product"""
     product = db.query(models.Product).filter(models.Product.id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    import forecasting
     forecaster = forecasting.DemandForecaster(db)
     df = forecaster.prepare_sales_history(product_id, days=days)
     
@@ -0,0 +1,223 @@
+"""
+Request-level metrics: latency histograms, status counts, in-flight requests
+and per-request SQL statement counts/time, exported in Prometheus text format
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import event
+
+logger = logging.getLogger("ecommerce.slow_sql")
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+SQL_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def render(self, name: str, labels: str) -> list:
+        lines = []
+        cumulative = 0
+        sep = "," if labels else ""
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class RequestContext:
+    """Per-request accumulator, reachable from SQLAlchemy events via a ContextVar"""
+    __slots__ = ("scope", "sql_count", "sql_time")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.sql_count = 0
+        self.sql_time = 0.0
+
+    @property
+    def route(self) -> str:
+        return route_label(self.scope)
+
+
+_current_request: ContextVar[Optional[RequestContext]] = ContextVar("current_request", default=None)
+
+
+def current_request() -> Optional[RequestContext]:
+    """Accumulator of the request being served, None outside a request"""
+    return _current_request.get()
+
+
+def route_label(scope) -> str:
+    """
+    Route template ("/products/{product_id}") rather than the raw path, so
+    label cardinality stays bounded. The router stores the matched route in
+    the scope once routing has happened.
+    """
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    return "unmatched"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_latency = {}   # (method, route) -> Histogram
+        self.request_status = {}    # (method, route, status) -> count
+        self.sql_statements = {}    # (method, route) -> Histogram of statements per request
+        self.sql_time = {}          # (method, route) -> Histogram of SQL seconds per request
+        self.in_flight = 0
+        self.slow_query_count = {}  # route -> statements over SLOW_QUERY_MS, ever
+        self.slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)  # recent ones, for /metrics/slow-queries
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self, method: str, route: str, status: int, duration: float, ctx: RequestContext):
+        key = (method, route)
+        with self._lock:
+            self.in_flight -= 1
+            self.request_latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(duration)
+            status_key = (method, route, status)
+            self.request_status[status_key] = self.request_status.get(status_key, 0) + 1
+            self.sql_statements.setdefault(key, Histogram(SQL_COUNT_BUCKETS)).observe(ctx.sql_count)
+            self.sql_time.setdefault(key, Histogram(SQL_TIME_BUCKETS)).observe(ctx.sql_time)
+
+    def record_slow_query(self, statement: str, duration: float, route: str):
+        entry = {
+            "statement": " ".join(statement.split())[:2000],
+            "duration_ms": round(duration * 1000, 2),
+            "route": route,
+            "at": datetime.utcnow().isoformat(),
+        }
+        with self._lock:
+            self.slow_queries.append(entry)
+            self.slow_query_count[route] = self.slow_query_count.get(route, 0) + 1
+        logger.warning("Slow SQL (%.1f ms) on %s: %s", entry["duration_ms"], route, entry["statement"][:300])
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            lines = [
+                "# HELP http_requests_in_flight Requests currently being served",
+                "# TYPE http_requests_in_flight gauge",
+                f"http_requests_in_flight {self.in_flight}",
+                "# HELP http_requests_total Requests by method, route and status code",
+                "# TYPE http_requests_total counter",
+            ]
+            for (method, route, status), count in sorted(self.request_status.items()):
+                lines.append(
+                    f'http_requests_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {count}'
+                )
+
+            for name, help_text, series in [
+                ("http_request_duration_seconds", "Request latency", self.request_latency),
+                ("http_request_sql_statements", "SQL statements executed per request", self.sql_statements),
+                ("http_request_sql_seconds", "Time spent in SQL per request", self.sql_time),
+            ]:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for (method, route), histogram in sorted(series.items()):
+                    lines.extend(histogram.render(name, f'method="{method}",route="{_escape(route)}"'))
+
+            lines.append("# HELP sql_slow_queries_total Statements slower than the slow-query threshold")
+            lines.append("# TYPE sql_slow_queries_total counter")
+            for route, count in sorted(self.slow_query_count.items()):
+                lines.append(f'sql_slow_queries_total{{route="{_escape(route)}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def slow_query_log(self) -> list:
+        with self._lock:
+            return list(reversed(self.slow_queries))
+
+
+registry = MetricsRegistry()
+
+
+def instrument_engine(engine):
+    """Count and time every statement run through `engine`"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["query_start_time"].pop()
+        ctx = _current_request.get()
+        if ctx is not None:
+            ctx.sql_count += 1
+            ctx.sql_time += duration
+        if duration * 1000 >= SLOW_QUERY_MS:
+            registry.record_slow_query(statement, duration, ctx.route if ctx is not None else "background")
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        # A failed statement never reaches after_cursor_execute; drop its start
+        # time so the connection does not carry it back into the pool
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start_time"):
+            conn.info["query_start_time"].pop()
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streaming responses pass through untouched"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        ctx = RequestContext(scope)
+        token = _current_request.set(ctx)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        registry.request_started()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            registry.request_finished(scope["method"], route_label(scope), status_code, duration, ctx)
+            _current_request.reset(token)
@@ -0,0 +1,103 @@
+"""
+Schema creation and lightweight in-place migrations.
+
+Runs once at API startup (disable with DB_INIT_ON_STARTUP=0) or explicitly
+before deploying:  python migrations.py
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateTable
+from database import engine, ensure_indexes
+import models
+import forecast_models  # noqa: F401  (registers forecasting tables on Base)
+import search
+
+
+def add_missing_columns(metadata, bind):
+    """
+    ALTER TABLE ... ADD COLUMN for model columns an existing table lacks.
+    Only suitable for nullable columns without server defaults; their
+    indexes (including unique ones) are created by ensure_indexes().
+    """
+    with bind.begin() as conn:
+        inspector = inspect(conn)
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=bind.dialect)
+                    conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+                    print(f"Added column {table.name}.{column.name}")
+
+
+# Indexes replaced by newer definitions on the models
+RETIRED_INDEXES = [
+    "ix_orders_customer_email_created_at_id",  # now on lower(customer_email)
+]
+
+
+def drop_retired_indexes(bind):
+    with bind.begin() as conn:
+        for name in RETIRED_INDEXES:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+
+# Live tables whose rows move to an archive table with their ids; their ids
+# must never be reused, or archived and new rows would share one
+AUTOINCREMENT_TABLES = [("orders", "orders_archive"), ("order_items", "order_items_archive")]
+
+
+def ensure_autoincrement(metadata, bind):
+    """
+    Rebuild the tables above if they were created without AUTOINCREMENT
+    (SQLite cannot add it in place), and start each id sequence above every
+    id already used, live or archived.
+    """
+    with bind.begin() as conn:
+        for name, archive_name in AUTOINCREMENT_TABLES:
+            table = metadata.tables[name]
+            sql = conn.exec_driver_sql(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+            ).scalar()
+            if "AUTOINCREMENT" not in sql.upper():
+                # New table under a temporary name, copy, drop the old one (and
+                # its indexes; ensure_indexes recreates them), then rename
+                create = str(CreateTable(table).compile(dialect=bind.dialect))
+                conn.exec_driver_sql(create.replace(f"CREATE TABLE {name} ", f"CREATE TABLE {name}_rebuild ", 1))
+                columns = ", ".join(c.name for c in table.columns)
+                conn.exec_driver_sql(f"INSERT INTO {name}_rebuild ({columns}) SELECT {columns} FROM {name}")
+                conn.exec_driver_sql(f"DROP TABLE {name}")
+                conn.exec_driver_sql(f"ALTER TABLE {name}_rebuild RENAME TO {name}")
+                print(f"Rebuilt {name} with AUTOINCREMENT")
+
+            top = conn.exec_driver_sql(
+                f"SELECT max(coalesce((SELECT max(id) FROM {name}), 0), "
+                f"coalesce((SELECT max(id) FROM {archive_name}), 0))"
+            ).scalar()
+            seq = conn.exec_driver_sql("SELECT seq FROM sqlite_sequence WHERE name = ?", (name,)).scalar()
+            if seq is None:
+                conn.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (name, top))
+            elif seq < top:
+                conn.exec_driver_sql("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (top, name))
+
+
+def init_db(bind=None):
+    """Create missing tables, columns, indexes and the search index. Safe to re-run."""
+    bind = bind if bind is not None else engine
+    models.Base.metadata.create_all(bind=bind)
+    add_missing_columns(models.Base.metadata, bind)
+    ensure_autoincrement(models.Base.metadata, bind)
+    ensure_indexes(models.Base.metadata, bind=bind)
+    drop_retired_indexes(bind)
+    search.init_search_index(bind)
+
+
+if __name__ == "__main__":
+    init_db()
+    print(f"Database ready: {engine.url}")
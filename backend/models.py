@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Index, func
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -19,11 +19,13 @@ class Product(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    description = Column(String, index=True)
+    description = Column(String)  # Searched through the products_fts index (see search.py)
     price = Column(Float)
     stock_quantity = Column(Integer)
     category = Column(String, index=True)
     image_url = Column(String, nullable=True)
+    # Supplier/catalog key used to match rows in bulk feeds (POST /products/bulk)
+    sku = Column(String, unique=True, index=True, nullable=True)
 
 class Order(Base):
     __tablename__ = "orders"
@@ -39,14 +41,87 @@ class Order(Base):
 
     items = relationship("OrderItem", back_populates="order")
 
+    # Composite indexes backing keyset pagination: every filter column is
+    # followed by the (created_at, id) sort key so each page is an index seek.
+    __table_args__ = (
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_status_created_at_id", "status", "created_at", "id"),
+        # Customer lookups match emails case-insensitively (chatbot, admin search)
+        Index("ix_orders_customer_email_lower_created_at_id", func.lower(customer_email), created_at, id),
+        # Archived orders keep their ids, so ids must never be handed out again
+        {"sqlite_autoincrement": True},
+    )
+
 class OrderItem(Base):
     __tablename__ = "order_items"
+    __table_args__ = {"sqlite_autoincrement": True}  # ids live on in order_items_archive
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
     product_id = Column(Integer, ForeignKey("products.id"))
     quantity = Column(Integer)
     price_at_purchase = Column(Float)
 
     order = relationship("Order", back_populates="items")
     product = relationship("Product")
+
+
+# --- Archive (see archive.py) ---
+# Orders older than the retention window move here, keeping their ids, after
+# being folded into OrderDailyRollup and forecast_models.SalesHistory.
+
+class ArchivedOrder(Base):
+    __tablename__ = "orders_archive"
+
+    id = Column(Integer, primary_key=True)
+    customer_name = Column(String)
+    customer_email = Column(String)
+    shipping_address = Column(String)
+    total_amount = Column(Float)
+    status = Column(String)
+    created_at = Column(DateTime, index=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    items = relationship("ArchivedOrderItem", back_populates="order")
+
+class ArchivedOrderItem(Base):
+    __tablename__ = "order_items_archive"
+
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey("orders_archive.id"), index=True)
+    product_id = Column(Integer, ForeignKey("products.id"))
+    quantity = Column(Integer)
+    price_at_purchase = Column(Float)
+
+    order = relationship("ArchivedOrder", back_populates="items")
+    product = relationship("Product")
+
+class OrderDailyRollup(Base):
+    """Order count and revenue per day of archived orders"""
+    __tablename__ = "order_daily_rollups"
+
+    date = Column(DateTime, primary_key=True)  # midnight UTC
+    order_count = Column(Integer, default=0, nullable=False)
+    total_amount = Column(Float, default=0.0, nullable=False)
+
+
+class DataVersion(Base):
+    """Version stamp per cacheable data set, bumped in the same transaction as the write"""
+    __tablename__ = "data_versions"
+
+    name = Column(String, primary_key=True)  # 'products', 'forecasts', 'alerts'
+    version = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ProductChange(Base):
+    """
+    One row per product changed by a write, in the same transaction. Catalog
+    caches in every worker read this to reload just the changed products.
+    """
+    __tablename__ = "product_changes"
+    __table_args__ = {"sqlite_autoincrement": True}  # ids never reused, even after pruning
+
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, nullable=True)  # NULL: reload the whole catalog
+    changed_at = Column(DateTime, default=datetime.utcnow)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
 
@@ -9,16 +9,61 @@ class ProductBase(BaseModel):
     stock_quantity: int
     category: str
     image_url: Optional[str] = None
+    sku: Optional[str] = None
 
 class ProductCreate(ProductBase):
     pass
 
 class Product(ProductBase):
     id: int
+    category: Optional[str] = None  # required on create; older rows may lack one
 
     class Config:
         orm_mode = True
 
+class ProductFeedRow(BaseModel):
+    """One record of a bulk product feed; only `sku` is always required"""
+    sku: str
+    name: Optional[str] = None
+    description: Optional[str] = None
+    price: Optional[float] = Field(None, ge=0)
+    stock_quantity: Optional[int] = Field(None, ge=0)
+    category: Optional[str] = None
+    image_url: Optional[str] = None
+
+class BulkProductRowResult(BaseModel):
+    line: int
+    sku: Optional[str] = None
+    status: str  # 'created', 'updated', 'unchanged' or 'error'
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class BulkProductResult(BaseModel):
+    created: int
+    updated: int
+    unchanged: int
+    failed: int
+    rows: List[BulkProductRowResult]
+
+class CategoryFacet(BaseModel):
+    category: str
+    count: int
+
+class PriceFacet(BaseModel):
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+class SearchFacets(BaseModel):
+    categories: List[CategoryFacet]
+    price: PriceFacet
+    in_stock: int
+    out_of_stock: int
+
+class ProductSearchResult(BaseModel):
+    total: int
+    items: List[Product]
+    facets: SearchFacets
+
 class UserBase(BaseModel):
     email: str
 
@@ -68,3 +113,24 @@ class Order(OrderBase):
 
 class OrderStatusUpdate(BaseModel):
     status: str
+
+class OrderStatusFilter(BaseModel):
+    status: Optional[str] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+
+class OrderBulkStatusUpdate(BaseModel):
+    """Target status for either an explicit list of ids or every order matching `filter`"""
+    status: str
+    ids: Optional[List[int]] = None
+    filter: Optional[OrderStatusFilter] = None
+
+class OrderStatusRejection(BaseModel):
+    id: int
+    status: Optional[str] = None  # current status, None if the order doesn't exist
+    reason: str
+
+class OrderBulkStatusResult(BaseModel):
+    status: str
+    updated: int
+    rejected: List[OrderStatusRejection]
@@ -0,0 +1,140 @@
+"""
+Full-text product search backed by an SQLite FTS5 index
+"""
+import re
+from sqlalchemy import func, literal_column, table, column
+from sqlalchemy.orm import Session
+import models
+
+FTS_TABLE = "products_fts"
+# Largest page a search may ask for; limit/offset are clamped to sane values
+SEARCH_MAX_LIMIT = 100
+
+# External-content FTS5 table: the index stores only tokens, the text itself
+# stays in `products`. Triggers keep it in sync on every insert/update/delete,
+# including bulk statements that bypass the ORM.
+_SEARCH_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description, category,
+        content='products', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON products BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, description, category ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+        INSERT INTO {FTS_TABLE}(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END""",
+]
+
+# Column weights for bm25(): a hit in the name matters most, then category
+products_fts = table(FTS_TABLE, column("rowid"))
+_fts_ref = literal_column(FTS_TABLE)
+_RANK = func.bm25(_fts_ref, 10.0, 2.0, 5.0)
+
+
+def init_search_index(engine):
+    """
+    Create the FTS5 table and sync triggers, populating the index on first run
+    """
+    with engine.begin() as conn:
+        existed = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+        ).first()
+        for statement in _SEARCH_DDL:
+            conn.exec_driver_sql(statement)
+        if not existed:
+            conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+        # The old B-tree index on description could never serve a text search
+        conn.exec_driver_sql("DROP INDEX IF EXISTS ix_products_description")
+
+
+def build_match_query(q: str) -> str:
+    """
+    Turn free text into a safe FTS5 MATCH expression.
+    Every word becomes a quoted prefix term, so user input can never be
+    parsed as FTS5 syntax ("OR", "NEAR", column filters, ...).
+    """
+    terms = re.findall(r"\w+", q or "", re.UNICODE)
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_products(db: Session, q: str = None, category: str = None,
+                    min_price: float = None, max_price: float = None, in_stock: bool = None,
+                    limit: int = 20, offset: int = 0) -> dict:
+    """
+    Ranked product search with category/price/stock facets.
+
+    Facets are disjunctive: each one is computed with every filter applied
+    except its own, so the UI can show what selecting another value would give.
+    Products without a category are counted in every facet but the category one.
+    """
+    match = build_match_query(q)
+    # A negative LIMIT means "no limit" to SQLite
+    limit = min(max(limit, 1), SEARCH_MAX_LIMIT)
+    offset = max(offset, 0)
+
+    def filtered(query, skip=None):
+        if match:
+            query = query.join(products_fts, products_fts.c.rowid == models.Product.id)\
+                .filter(_fts_ref.op("MATCH")(match))
+        if category and skip != "category":
+            query = query.filter(models.Product.category == category)
+        if skip != "price":
+            if min_price is not None:
+                query = query.filter(models.Product.price >= min_price)
+            if max_price is not None:
+                query = query.filter(models.Product.price <= max_price)
+        if in_stock is not None and skip != "in_stock":
+            if in_stock:
+                query = query.filter(models.Product.stock_quantity > 0)
+            else:
+                query = query.filter(models.Product.stock_quantity <= 0)
+        return query
+
+    # 1. Ranked page of results
+    items_query = filtered(db.query(models.Product))
+    if match:
+        items_query = items_query.order_by(_RANK, models.Product.id)
+    else:
+        items_query = items_query.order_by(models.Product.id)
+    items = items_query.offset(offset).limit(limit).all()
+
+    total = filtered(db.query(func.count(models.Product.id))).scalar()
+
+    # 2. Facets
+    category_rows = filtered(
+        db.query(models.Product.category, func.count(models.Product.id)), skip="category"
+    ).filter(models.Product.category.isnot(None)).group_by(models.Product.category).order_by(func.count(models.Product.id).desc()).all()
+
+    price_min, price_max = filtered(
+        db.query(func.min(models.Product.price), func.max(models.Product.price)), skip="price"
+    ).one()
+
+    in_stock_count, out_of_stock_count = filtered(
+        db.query(
+            func.count(models.Product.id).filter(models.Product.stock_quantity > 0),
+            func.count(models.Product.id).filter(models.Product.stock_quantity <= 0),
+        ),
+        skip="in_stock"
+    ).one()
+
+    return {
+        "total": total,
+        "items": items,
+        "facets": {
+            "categories": [{"category": c, "count": n} for c, n in category_rows],
+            "price": {"min": price_min, "max": price_max},
+            "in_stock": in_stock_count or 0,
+            "out_of_stock": out_of_stock_count or 0,
+        },
+    }
@@ -0,0 +1,105 @@
+"""
+Version stamps and conditional GET (ETag / Last-Modified) support
+"""
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional
+from fastapi import Request, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+import models
+
+PRODUCTS = "products"
+FORECASTS = "forecasts"
+ALERTS = "alerts"
+
+# Entries kept in product_changes, and the most logged one by one per write
+PRODUCT_CHANGE_LOG_SIZE = 10000
+PRODUCT_CHANGES_PER_WRITE = 500
+
+
+def bump(db: Session, *names: str):
+    """
+    Advance the version of each data set. Call before the caller's commit so
+    the stamp changes atomically with the data it describes. Stamps live in
+    the database, so every worker process sees the same versions.
+    """
+    now = datetime.utcnow()
+    for name in names:
+        updated = db.query(models.DataVersion).filter(models.DataVersion.name == name).update(
+            {models.DataVersion.version: models.DataVersion.version + 1,
+             models.DataVersion.updated_at: now},
+            synchronize_session=False
+        )
+        if not updated:
+            db.add(models.DataVersion(name=name, version=1, updated_at=now))
+            db.flush()
+
+
+def log_product_changes(db: Session, product_ids: Iterable[int] = None):
+    """
+    Record which products a write changed (None: possibly all of them) for
+    the catalog caches. Call before the caller's commit, like bump(). Large
+    batches are logged as one full-reload entry; old entries are pruned.
+    """
+    ids = None if product_ids is None else set(product_ids)
+    if ids is not None and not ids:
+        return
+    if ids is None or len(ids) > PRODUCT_CHANGES_PER_WRITE:
+        db.add(models.ProductChange(product_id=None))
+    else:
+        db.add_all(models.ProductChange(product_id=product_id) for product_id in ids)
+    db.flush()
+    newest = db.query(func.max(models.ProductChange.id)).scalar()
+    db.query(models.ProductChange).filter(
+        models.ProductChange.id <= newest - PRODUCT_CHANGE_LOG_SIZE
+    ).delete(synchronize_session=False)
+
+
+def current(db: Session, *names: str) -> dict:
+    """Map of name -> (version, updated_at); unknown names report version 0"""
+    rows = db.query(models.DataVersion).filter(models.DataVersion.name.in_(names)).all()
+    found = {row.name: (row.version, row.updated_at) for row in rows}
+    return {name: found.get(name, (0, None)) for name in names}
+
+
+def _strip_weak(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def conditional_get(request: Request, response: Response, stamps: dict) -> Optional[Response]:
+    """
+    Stamp `response` with an ETag/Last-Modified derived from `stamps` (as
+    returned by current()) and return a bare 304 if the client's copy is
+    still current. Endpoints should return that 304 as-is, before running
+    their query.
+    """
+    etag = 'W/"' + "-".join(f"{name}.{version}" for name, (version, _) in stamps.items()) + '"'
+    modified = [updated_at for _, updated_at in stamps.values() if updated_at]
+    last_modified = max(modified).replace(microsecond=0) if modified else None
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified.replace(tzinfo=timezone.utc), usegmt=True)
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        # If-None-Match takes precedence over If-Modified-Since
+        tags = [_strip_weak(t) for t in if_none_match.split(",")]
+        if "*" in tags or _strip_weak(etag) in tags:
+            return Response(status_code=304, headers=headers)
+        return None
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return None
+        if since.tzinfo:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        if last_modified <= since:
+            return Response(status_code=304, headers=headers)
+    return None
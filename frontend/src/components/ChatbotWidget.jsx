@@ -11,6 +11,8 @@ const ChatbotWidget = () => {
             { id: 1, text: "Hi! 👋 I'm your AI Assistant. How can I help you today?", sender: 'ai' }
         ];
     });
+    // Server-side conversation, so follow-up questions keep their context
+    const sessionIdRef = useRef(localStorage.getItem('chatbot_session'));
     const [inputValue, setInputValue] = useState("");
     const [loading, setLoading] = useState(false);
     const messagesEndRef = useRef(null);
@@ -50,17 +52,68 @@ const ChatbotWidget = () => {
             inputRef.current?.focus();
         }, 0);
 
+        const aiMsgId = Date.now() + 1;
+        let started = false;
+        const appendToReply = (text) => {
+            if (!started) {
+                // First token: swap the typing indicator for the reply bubble
+                started = true;
+                setLoading(false);
+                setMessages(prev => [...prev, { id: aiMsgId, text, sender: 'ai' }]);
+            } else {
+                setMessages(prev => prev.map(msg => msg.id === aiMsgId ? { ...msg, text: msg.text + text } : msg));
+            }
+        };
+
         try {
-            const response = await api.post('/chat/message', { message: userMsg.text });
-            const aiResponseText = response.data.reply;
+            // Server-Sent Events over a POST, so fetch instead of EventSource
+            const response = await fetch(`${api.defaults.baseURL}/chat/stream`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+                body: JSON.stringify({ message: userMsg.text, session_id: sessionIdRef.current }),
+            });
+            if (!response.ok || !response.body) throw new Error(`HTTP ${response.status}`);
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = "";
+            let finished = false;
+            while (!finished) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
 
-            const aiMsg = { id: Date.now() + 1, text: aiResponseText, sender: 'ai' };
-            setMessages(prev => [...prev, aiMsg]);
+                let boundary;
+                while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+                    const rawEvent = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+                    let event = "message";
+                    let data = "";
+                    for (const line of rawEvent.split("\n")) {
+                        if (line.startsWith("event:")) event = line.slice(6).trim();
+                        else if (line.startsWith("data:")) data += line.slice(5).trim();
+                    }
+                    const payload = data ? JSON.parse(data) : {};
+                    if (event === "session") {
+                        sessionIdRef.current = payload.session_id;
+                        localStorage.setItem('chatbot_session', payload.session_id);
+                    } else if (event === "token") {
+                        appendToReply(payload.text);
+                    } else if (event === "error") {
+                        appendToReply(`\n\n⚠️ ${payload.message}`);
+                    } else if (event === "done") {
+                        finished = true;
+                    }
+                }
+            }
+            if (!started) throw new Error("Empty reply");
 
         } catch (error) {
             console.error("Chat error", error);
-            const errorMsg = { id: Date.now() + 1, text: "Sorry, connection failed. Please check your internet or try again later.", sender: 'ai', isError: true };
-            setMessages(prev => [...prev, errorMsg]);
+            if (!started) {
+                const errorMsg = { id: aiMsgId, text: "Sorry, connection failed. Please check your internet or try again later.", sender: 'ai', isError: true };
+                setMessages(prev => [...prev, errorMsg]);
+            }
         } finally {
             setLoading(false);
         }
@@ -71,6 +124,9 @@ const ChatbotWidget = () => {
             const clearMsg = { id: Date.now(), text: "Chat cleared. How can I help now?", sender: 'ai' };
             setMessages([clearMsg]);
             localStorage.setItem('chatbot_messages', JSON.stringify([clearMsg]));
+            // Start a fresh conversation on the server too
+            sessionIdRef.current = null;
+            localStorage.removeItem('chatbot_session');
         }
     };
 